@@ -1,10 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./parsec_playground.db"
 
+# Sessions are opened from the event loop thread. A pool checkout that
+# waited for a free connection would block the loop, and with it every request
+# that could hand one back, so the pool never caps connections.
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, max_overflow=-1
 )
 
 SessionLocal = sessionmaker(
@@ -13,10 +16,70 @@ SessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+# Bump whenever the models change. Databases already at this version skip
+# schema inspection entirely, so a worker's startup costs a single PRAGMA.
+SCHEMA_VERSION = 3
+
 def init_db():
-    """Initialize the database connection."""
-    from app.db.models import Run, Template, TemplateVersion
+    """Initialize the database, creating or migrating the schema if it is out of date."""
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= SCHEMA_VERSION:
+            return
+
+    from app.db.models import Run, Template, TemplateVersion, ReplayJob, ReplayItem
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _create_search_index()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def _add_missing_columns():
+    """Add columns introduced after a table was first created.
+
+    create_all only creates missing tables, so new (nullable) columns on
+    existing tables are added here with ALTER TABLE.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def _create_search_index():
+    """Create the FTS5 index over run prompts and outputs, and the triggers that maintain it.
+
+    `runs_fts` is an external-content table: it stores only the index and
+    reads the text from `runs`. A newly created index is built from the
+    existing rows once.
+    """
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'runs_fts'"
+        ).scalar()
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5("
+            "prompt, raw_output, content='runs', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='3')"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS runs_fts_insert AFTER INSERT ON runs BEGIN "
+            "INSERT INTO runs_fts(rowid, prompt, raw_output) VALUES (new.id, new.prompt, new.raw_output); END"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS runs_fts_delete AFTER DELETE ON runs BEGIN "
+            "INSERT INTO runs_fts(runs_fts, rowid, prompt, raw_output) VALUES ('delete', old.id, old.prompt, old.raw_output); END"
+        )
+        conn.exec_driver_sql(
+            "CREATE TRIGGER IF NOT EXISTS runs_fts_update AFTER UPDATE OF prompt, raw_output ON runs BEGIN "
+            "INSERT INTO runs_fts(runs_fts, rowid, prompt, raw_output) VALUES ('delete', old.id, old.prompt, old.raw_output); "
+            "INSERT INTO runs_fts(rowid, prompt, raw_output) VALUES (new.id, new.prompt, new.raw_output); END"
+        )
+        if not exists:
+            conn.exec_driver_sql("INSERT INTO runs_fts(runs_fts) VALUES ('rebuild')")
 
 def get_db():
     """Provide a database session."""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Text, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Text, Float, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.database import Base
@@ -43,10 +43,51 @@ class Run(Base):
     parsed_output = Column(JSON)
     validation_errors = Column(JSON)
     latency_ms = Column(Float)
+    total_latency_ms = Column(Float)
     tokens_used = Column(Integer)
     retry_count = Column(Integer, default=0)
+    repair_count = Column(Integer, default=0)
+    max_tokens = Column(Integer)
+    max_tokens_auto = Column(Boolean)
+    truncation_retries = Column(Integer, default=0)
+    timings = Column(JSON)
+    # Set on runs produced by a replay job, which are kept out of history and statistics
+    replay_job_id = Column(Integer, ForeignKey("replay_jobs.id"), nullable=True)
     validation_status = Column(Boolean, default=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     template = relationship("Template", back_populates="runs")
 
+class ReplayJob(Base):
+
+    __tablename__ = "replay_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    filters = Column(JSON)
+    temperature = Column(Float, default=0.7)
+    concurrency = Column(Integer, default=4)
+    requests_per_minute = Column(Float)
+    status = Column(String, default="pending", index=True)
+    report = Column(JSON)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+    items = relationship("ReplayItem", back_populates="job", cascade="all, delete-orphan")
+
+class ReplayItem(Base):
+
+    __tablename__ = "replay_items"
+    __table_args__ = (Index("ix_replay_items_job_status", "job_id", "status"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("replay_jobs.id"), nullable=False)
+    source_run_id = Column(Integer, ForeignKey("runs.id"), nullable=False)
+    result_run_id = Column(Integer, ForeignKey("runs.id"), nullable=True)
+    status = Column(String, default="pending")
+    error = Column(Text)
+
+    job = relationship("ReplayJob", back_populates="items")
+    source_run = relationship("Run", foreign_keys=[source_run_id])
+    result_run = relationship("Run", foreign_keys=[result_run_id])
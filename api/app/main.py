@@ -4,8 +4,13 @@ from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from pathlib import Path
 
-from app.routes import generate, templates, history, analytics
-from app.db.database import init_db
+import asyncio
+
+from app.routes import generate, templates, history, analytics, replay, metrics
+from app.db.database import SessionLocal, init_db
+from app.services import replay as replay_service
+from app.services.llm import warm_imports
+from app.services.metrics import MetricsMiddleware, install_db_timing, monitor_event_loop_lag
 
 # Load environment variables from .env file
 # Get the api directory (parent of app directory)
@@ -24,8 +29,16 @@ else:
 async def lifespan(app: FastAPI):
     # Startup: Initialize the database
     init_db()
+    # Pick up replay jobs interrupted by the last shutdown or crash
+    replay_service.resume_jobs()
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    # Load parsec and the provider SDKs now rather than inside the first generate request
+    warmup = asyncio.create_task(warm_imports())
     yield
-    # Shutdown: Add any cleanup code here if necessary
+    # Shutdown: Stop replay jobs; they resume from their checkpoint on next start
+    replay_service.shutdown()
+    loop_lag_monitor.cancel()
+    warmup.cancel()
 
 app = FastAPI(
     title="Parsec Playground API",
@@ -41,11 +54,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+install_db_timing(SessionLocal)
 
 app.include_router(generate.router, prefix="/api", tags=["generate"])
 app.include_router(templates.router, prefix="/api/templates", tags=["templates"])
 app.include_router(history.router, prefix="/api/history", tags=["history"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(replay.router, prefix="/api/replay", tags=["replay"])
+app.include_router(metrics.router, tags=["metrics"])
 
 @app.get("/")
 def read_root():
@@ -14,9 +14,14 @@ class GenerateRequest(BaseModel):
     model: str
     # TODO: fix these defaults later
     temperature: Optional[float] = Field(0.7, ge=0.0, le=1.0)
-    max_tokens: Optional[int] = 1000
+    max_tokens: Optional[int] = Field(None, ge=1, description="Output token limit. Estimated from the schema and the template's past runs if not set.")
     template_id: Optional[int] = None
     api_key: Optional[str] = Field(None, description="Optional user-provided API key. If not provided, uses server's API key from environment.")
+    hedge: bool = Field(False, description="Launch a backup attempt if the request runs past the recent latency percentile for this provider/model.")
+    hedge_provider: Optional[str] = Field(None, description="Provider for the backup attempt. Defaults to the requested provider.")
+    hedge_model: Optional[str] = Field(None, description="Model for the backup attempt. Defaults to the requested model.")
+    deadline_ms: Optional[int] = Field(None, ge=1, description="Overall time allowed for the request, including retries. Defaults to REQUEST_DEADLINE_MS.")
+    priority: str = Field("interactive", pattern="^(interactive|batch)$", description="Admission priority. Interactive requests are served ahead of batch traffic.")
 
 class GenerateResponse(BaseModel):
     """
@@ -28,7 +33,32 @@ class GenerateResponse(BaseModel):
     validation_status: bool
     validation_errors: Optional[List[dict]] = None
     latency_ms: float
+    total_latency_ms: float = 0.0
     tokens_used: int
+    max_tokens: Optional[int] = None
+    repair_count: int = 0
+    queue_time_ms: float = 0.0
+
+class CompareTarget(BaseModel):
+    """
+    A provider/model pair to run in a comparison.
+    """
+    provider: str
+    model: str
+    api_key: Optional[str] = Field(None, description="Optional user-provided API key for this provider.")
+
+class CompareRequest(BaseModel):
+    """
+    Request to run one prompt and json_schema against several provider/model pairs.
+    """
+    prompt: str
+    json_schema: dict
+    targets: List[CompareTarget] = Field(..., min_length=1, max_length=10)
+    temperature: Optional[float] = Field(0.7, ge=0.0, le=1.0)
+    max_tokens: Optional[int] = Field(None, ge=1, description="Output token limit. Estimated from the schema and the template's past runs if not set.")
+    template_id: Optional[int] = None
+    deadline_ms: Optional[int] = Field(None, ge=1, description="Overall deadline. Targets still running are cancelled and reported as timed out.")
+    priority: str = Field("interactive", pattern="^(interactive|batch)$")
 
 # ========================== Template Models ========================
 
@@ -59,11 +89,12 @@ class TemplateVersionResponse(BaseModel):
     version: int
     content: str
     variables: Optional[dict] = None
-    json_schema: dict
+    json_schema: dict = Field(..., validation_alias="schema")
     created_at: datetime
 
     class Config:
         from_attributes = True
+        populate_by_name = True
 
 class TemplateResponse(BaseModel):
     """
@@ -80,6 +111,15 @@ class TemplateResponse(BaseModel):
 
 # ========================== History Models ========================
 
+class TimingSpan(BaseModel):
+    """
+    One timed phase of a run, in milliseconds from the start of the request.
+    """
+    name: str
+    start_ms: float
+    duration_ms: float
+    description: Optional[str] = None
+
 class RunResponse(BaseModel):
     """
     Response containing run details.
@@ -89,13 +129,20 @@ class RunResponse(BaseModel):
     provider: str
     model: str
     prompt: str
-    json_schema: dict = Field(..., alias="schema")
+    json_schema: dict = Field(..., validation_alias="schema")
     raw_output: Optional[str] = None
     parsed_output: Optional[Any] = None
-    validation_errors: Optional[List[str]] = None
+    validation_errors: Optional[List[dict]] = None
     latency_ms: Optional[float] = None
+    total_latency_ms: Optional[float] = None
     tokens_used: Optional[int] = None
     retry_count: int
+    repair_count: Optional[int] = 0
+    max_tokens: Optional[int] = None
+    max_tokens_auto: Optional[bool] = None
+    truncation_retries: Optional[int] = None
+    timings: Optional[List[TimingSpan]] = None
+    replay_job_id: Optional[int] = None
     validation_status: bool
     created_at: datetime
 
@@ -106,11 +153,81 @@ class RunResponse(BaseModel):
 class HistoryResponse(BaseModel):
     """
     Paginated response containing a list of runs for history.
+    Search results (`q`) have no total or page number; follow `next_cursor` instead.
+    `truncated` is set when the search matched more runs than it ranks.
     """
     runs: List[RunResponse] = []
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     page_size: int
+    next_cursor: Optional[str] = None
+    truncated: bool = False
+
+# ========================== Replay Models ========================
+
+class RunFilters(BaseModel):
+    """
+    History filters used to select the runs to replay.
+    """
+    template_id: Optional[int] = None
+    provider: Optional[str] = None
+    validation_status: Optional[bool] = None
+
+class ReplayCreate(BaseModel):
+    """
+    Request to replay historical runs against a provider/model.
+    """
+    provider: str
+    model: str
+    filters: RunFilters = RunFilters()
+    limit: int = Field(1000, ge=1, le=100000, description="Most recent matching runs to replay")
+    temperature: float = Field(0.7, ge=0.0, le=1.0)
+    concurrency: int = Field(4, ge=1, le=64)
+    requests_per_minute: Optional[float] = Field(None, gt=0, description="Optional job-level rate limit on top of provider admission limits")
+
+class ReplayJobResponse(BaseModel):
+    """
+    Response containing a replay job and its progress.
+    """
+    id: int
+    provider: str
+    model: str
+    filters: dict
+    status: str # "pending" | "running" | "completed" | "cancelled" | "failed"
+    concurrency: int
+    requests_per_minute: Optional[float] = None
+    total: int
+    pending: int
+    done: int
+    failed: int
+    created_at: datetime
+    updated_at: datetime
+
+class ReplaySummary(BaseModel):
+    """
+    Aggregate metrics for one side of a replay comparison.
+    """
+    runs: int
+    success_rate: float
+    avg_latency: float
+    p50_latency: float
+    p95_latency: float
+    p99_latency: float
+    avg_tokens: float
+    avg_retries: float
+
+class ReplayReport(BaseModel):
+    """
+    Side-by-side comparison of source runs and their replays.
+    """
+    job_id: int
+    status: str
+    compared: int
+    source: ReplaySummary
+    replay: ReplaySummary
+    avg_token_delta: float
+    newly_passing: int
+    newly_failing: int
 
 # ========================== Analytics Models ======================== 
 
@@ -129,6 +246,29 @@ class AnalyticsResponse(BaseModel):
     total_tokens: int
     avg_tokens: float
     error_breakdown: dict
+    repair_hits: int = 0
+    estimated_tokens_saved: float = 0.0
+    estimated_latency_saved_ms: float = 0.0
+    retries_per_success: float = 0.0
+    avg_total_latency_first_try: float = 0.0
+    avg_total_latency_with_retries: float = 0.0
+    retry_budgets: dict = {}
+    truncation_retry_rate_manual: float = 0.0
+    truncation_retry_rate_auto: float = 0.0
+
+class HedgeStatsResponse(BaseModel):
+    """
+    Response containing process-wide hedged request statistics.
+    """
+    requests: int
+    hedges: int
+    hedge_rate: float
+    hedge_wins: int
+    budget_skips: int
+    capacity_skips: int
+    latency_saved_ms: float
+    primary_tokens: int
+    extra_tokens: int
 
 # ========================== WebSocket Models ========================
 
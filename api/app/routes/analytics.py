@@ -1,14 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-import numpy as np
 
-from app.models.schemas import AnalyticsResponse
+from app.models.schemas import AnalyticsResponse, HedgeStatsResponse
 from app.db.database import get_db
 from app.db.models import Run, Template
+from app.services.hedging import hedge_stats
+from app.services.retry_policy import get_retry_stats
+from app.services.stats import percentile
 
 router = APIRouter()
 
+@router.get("/hedging", response_model=HedgeStatsResponse)
+def get_hedging_stats():
+    """
+    Get hedge rate, extra token spend and estimated latency saved by hedged requests.
+    """
+    return HedgeStatsResponse(**hedge_stats.snapshot())
+
+
 @router.get("/{template_id}", response_model=AnalyticsResponse)
 def get_template_analytics(template_id: int, db: Session = Depends(get_db)):
     """
@@ -20,7 +30,7 @@ def get_template_analytics(template_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Template not found")
 
     # Get all runs for this template
-    runs = db.query(Run).filter(Run.template_id == template_id).all()
+    runs = db.query(Run).filter(Run.template_id == template_id, Run.replay_job_id.is_(None)).all()
 
     if not runs:
         # Return empty analytics if no runs
@@ -46,15 +56,38 @@ def get_template_analytics(template_id: int, db: Session = Depends(get_db)):
     # Latency metrics
     latencies = [run.latency_ms for run in runs if run.latency_ms is not None]
     avg_latency = sum(latencies) / len(latencies) if latencies else 0.0
-    p50_latency = float(np.percentile(latencies, 50)) if latencies else 0.0
-    p95_latency = float(np.percentile(latencies, 95)) if latencies else 0.0
-    p99_latency = float(np.percentile(latencies, 99)) if latencies else 0.0
+    p50_latency = percentile(latencies, 50) if latencies else 0.0
+    p95_latency = percentile(latencies, 95) if latencies else 0.0
+    p99_latency = percentile(latencies, 99) if latencies else 0.0
 
     # Token metrics
     tokens = [run.tokens_used for run in runs if run.tokens_used is not None]
     total_tokens = sum(tokens)
     avg_tokens = total_tokens / len(tokens) if tokens else 0.0
 
+    # Each local repair hit stands in for an LLM retry that was never sent,
+    # so credit it with the template's average per-call tokens and latency
+    repair_hits = sum(run.repair_count or 0 for run in runs)
+    estimated_tokens_saved = repair_hits * avg_tokens
+    estimated_latency_saved_ms = repair_hits * avg_latency
+
+    # Retry cost: retries spent per validated output, and what they add end to end
+    retries_per_success = sum(run.retry_count or 0 for run in runs) / successful_runs if successful_runs else 0.0
+    first_try = [run.total_latency_ms for run in runs if run.total_latency_ms is not None and not run.retry_count]
+    with_retries = [run.total_latency_ms for run in runs if run.total_latency_ms is not None and run.retry_count]
+    avg_total_latency_first_try = sum(first_try) / len(first_try) if first_try else 0.0
+    avg_total_latency_with_retries = sum(with_retries) / len(with_retries) if with_retries else 0.0
+    # Truncation-driven retries with client-set limits versus estimated ones.
+    # Runs from before truncation tracking carry no data and are left out.
+    def truncation_retry_rate(auto: bool) -> float:
+        tracked = [run for run in runs if run.truncation_retries is not None and bool(run.max_tokens_auto) == auto]
+        return sum(1 for run in tracked if run.truncation_retries) / len(tracked) if tracked else 0.0
+
+    retry_budgets = {
+        model: get_retry_stats(template_id, model).budget()
+        for model in {run.model for run in runs}
+    }
+
     # Error breakdown
     error_breakdown = {}
     failed_runs = [run for run in runs if not run.validation_status]
@@ -75,7 +108,16 @@ def get_template_analytics(template_id: int, db: Session = Depends(get_db)):
         p99_latency=p99_latency,
         total_tokens=total_tokens,
         avg_tokens=avg_tokens,
-        error_breakdown=error_breakdown
+        error_breakdown=error_breakdown,
+        repair_hits=repair_hits,
+        estimated_tokens_saved=estimated_tokens_saved,
+        estimated_latency_saved_ms=estimated_latency_saved_ms,
+        retries_per_success=retries_per_success,
+        avg_total_latency_first_try=avg_total_latency_first_try,
+        avg_total_latency_with_retries=avg_total_latency_with_retries,
+        retry_budgets=retry_budgets,
+        truncation_retry_rate_manual=truncation_retry_rate(auto=False),
+        truncation_retry_rate_auto=truncation_retry_rate(auto=True)
     )
 
 
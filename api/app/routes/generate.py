@@ -1,68 +1,161 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+import asyncio
 import json
+import time
 
-from app.models.schemas import GenerateRequest, GenerateResponse
-from app.db.database import get_db
-from app.db.models import Run
-from app.services.llm import generate_with_enforcement
+from app.models.schemas import GenerateRequest, GenerateResponse, CompareRequest, CompareTarget
+from app.db.database import get_db, SessionLocal
+from app.services.hedging import HedgePolicy
+from app.services import metrics, timing
+from app.services.admission import admission_controller, AdmissionTimeout
+from app.services.runner import execute_run
+from app.services.token_budget import estimate_max_tokens
 from app.services.streaming import stream_generate
 
 router = APIRouter()
 
 @router.post("/generate", response_model=GenerateResponse)
-async def generate(request: GenerateRequest, db: Session = Depends(get_db)):
-    try:
-        (
-            parsed_output,
-            raw_output,
-            validation_status,
-            validation_errors,
-            latency_ms,
-            tokens_used,
-            retry_count
-        ) =  await generate_with_enforcement(
-            provider=request.provider,
-            model=request.model,
-            prompt=request.prompt,
-            schema=request.json_schema,
-            temperature=request.temperature,
-            max_tokens=request.max_tokens,
-            api_key=request.api_key
-        )
-        run = Run(
-            template_id=request.template_id,
-            provider=request.provider,
-            model=request.model,
-            prompt=request.prompt,
-            schema=request.json_schema,
-            raw_output=raw_output,
-            parsed_output=parsed_output,
-            validation_status=validation_status,
-            validation_errors=validation_errors,
-            latency_ms=latency_ms,
-            tokens_used=tokens_used,
-            retry_count=retry_count
+async def generate(request: GenerateRequest, response: Response, db: Session = Depends(get_db)):
+    hedge_policy = None
+    if request.hedge:
+        hedge_policy = HedgePolicy(
+            fallback_provider=request.hedge_provider,
+            fallback_model=request.hedge_model
         )
-        db.add(run)
-        db.commit()
-        db.refresh(run)
 
-        return GenerateResponse(
-            run_id=run.id,
-            raw_output=raw_output,
-            parsed_output=parsed_output,
-            validation_status=validation_status,
-            validation_errors=validation_errors,
-            latency_ms=latency_ms,
-            tokens_used=tokens_used
-        )
-    except Exception as e:
-        db.rollback()
-        import traceback
-        error_detail = f"{str(e)}\n{traceback.format_exc()}"
-        print(f"Error in generate endpoint: {error_detail}")
-        raise HTTPException(status_code=500, detail=str(e))
+    with timing.trace() as trace:
+        try:
+            run, result, ticket = await execute_run(
+                db,
+                provider=request.provider,
+                model=request.model,
+                prompt=request.prompt,
+                schema=request.json_schema,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                api_key=request.api_key,
+                template_id=request.template_id,
+                priority=request.priority,
+                deadline_ms=request.deadline_ms,
+                hedge_policy=hedge_policy
+            )
+
+            response.headers["Server-Timing"] = trace.server_timing()
+            return GenerateResponse(
+                run_id=run.id,
+                raw_output=result.raw_output,
+                parsed_output=result.parsed_output,
+                validation_status=result.validation_status,
+                validation_errors=result.validation_errors,
+                latency_ms=result.latency_ms,
+                total_latency_ms=result.total_latency_ms,
+                tokens_used=result.tokens_used,
+                max_tokens=result.max_tokens,
+                repair_count=result.repair_count,
+                queue_time_ms=ticket.queue_ms
+            )
+        except AdmissionTimeout as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Server-Timing": trace.server_timing()})
+        except TimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e), headers={"Server-Timing": trace.server_timing()})
+        except Exception as e:
+            db.rollback()
+            import traceback
+            error_detail = f"{str(e)}\n{traceback.format_exc()}"
+            print(f"Error in generate endpoint: {error_detail}")
+            raise HTTPException(status_code=500, detail=str(e), headers={"Server-Timing": trace.server_timing()})
+
+
+@router.post("/generate/compare")
+async def compare(request: CompareRequest):
+    """
+    Run one prompt and schema against several provider/model pairs concurrently.
+    Streams NDJSON, one line per target in the order they finish, then a "done" line.
+    Targets still running at the deadline are cancelled and reported as "timeout".
+    """
+    async def run_target(target: CompareTarget) -> dict:
+        # Each target commits its own Run, so each needs its own session
+        db = SessionLocal()
+        try:
+            run, result, ticket = await execute_run(
+                db,
+                provider=target.provider,
+                model=target.model,
+                prompt=request.prompt,
+                schema=request.json_schema,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                api_key=target.api_key,
+                template_id=request.template_id,
+                priority=request.priority,
+                deadline_ms=request.deadline_ms
+            )
+            response = GenerateResponse(
+                run_id=run.id,
+                raw_output=result.raw_output,
+                parsed_output=result.parsed_output,
+                validation_status=result.validation_status,
+                validation_errors=result.validation_errors,
+                latency_ms=result.latency_ms,
+                total_latency_ms=result.total_latency_ms,
+                tokens_used=result.tokens_used,
+                max_tokens=result.max_tokens,
+                repair_count=result.repair_count,
+                queue_time_ms=ticket.queue_ms
+            )
+            return {"type": "result", **response.model_dump()}
+        except Exception as e:
+            db.rollback()
+            return {"type": "error", "message": str(e)}
+        finally:
+            db.close()
+
+    async def stream():
+        start = time.perf_counter()
+        deadline = start + request.deadline_ms / 1000 if request.deadline_ms else None
+        pending = {asyncio.create_task(run_target(target)): target for target in request.targets}
+        completed = 0
+
+        try:
+            while pending:
+                timeout = max(deadline - time.perf_counter(), 0) if deadline is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    target = pending.pop(task)
+                    completed += 1
+                    line = {
+                        "provider": target.provider,
+                        "model": target.model,
+                        "elapsed_ms": (time.perf_counter() - start) * 1000,
+                        **task.result()
+                    }
+                    yield json.dumps(line) + "\n"
+
+            for task, target in pending.items():
+                task.cancel()
+                yield json.dumps({
+                    "type": "timeout",
+                    "provider": target.provider,
+                    "model": target.model,
+                    "elapsed_ms": (time.perf_counter() - start) * 1000
+                }) + "\n"
+
+            yield json.dumps({
+                "type": "done",
+                "completed": completed,
+                "timed_out": len(pending),
+                "elapsed_ms": (time.perf_counter() - start) * 1000
+            }) + "\n"
+        finally:
+            # Client went away or the deadline passed: stop paying for unfinished targets
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
     
 @router.websocket("/ws/stream")
 async def websocket_stream(websocket: WebSocket):
@@ -71,6 +164,7 @@ async def websocket_stream(websocket: WebSocket):
     Client sends request, receives token-by-token updates.
     """
     await websocket.accept()
+    metrics.active_websocket_streams.inc()
     
     try:
         # Receive generation request from client
@@ -83,7 +177,7 @@ async def websocket_stream(websocket: WebSocket):
         prompt = request_data.get("prompt")
         schema = request_data.get("schema")
         temperature = request_data.get("temperature", 0.7)
-        max_tokens = request_data.get("max_tokens", 1000)
+        max_tokens = request_data.get("max_tokens")
         
         # Validate required fields
         if not all([provider, model, prompt, schema]):
@@ -93,17 +187,26 @@ async def websocket_stream(websocket: WebSocket):
             })
             await websocket.close()
             return
+
+        if max_tokens is None:
+            max_tokens = estimate_max_tokens(schema, request_data.get("template_id"))
         
         # Stream generation
-        await stream_generate(
-            websocket=websocket,
-            prompt=prompt,
-            schema=schema,
+        async with admission_controller.admit(
             provider=provider,
             model=model,
-            temperature=temperature,
+            prompt=prompt,
             max_tokens=max_tokens
-        )
+        ):
+            await stream_generate(
+                websocket=websocket,
+                prompt=prompt,
+                schema=schema,
+                provider=provider,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
         
     except WebSocketDisconnect:
         print("Client disconnected from WebSocket")
@@ -116,6 +219,7 @@ async def websocket_stream(websocket: WebSocket):
         except:
             pass
     finally:
+        metrics.active_websocket_streams.dec()
         try:
             await websocket.close()
         except:
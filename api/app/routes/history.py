@@ -1,36 +1,69 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.models.schemas import HistoryResponse, RunResponse
 from app.db.database import get_db
 from app.db.models import Run
+from app.services.search import InvalidCursor, search_runs
 
 router = APIRouter()
 
+def filter_runs(
+    query,
+    template_id: Optional[int] = None,
+    provider: Optional[str] = None,
+    validation_status: Optional[bool] = None
+):
+    """
+    Apply the history filters to a Run query. Runs produced by replay jobs are excluded.
+    """
+    query = query.filter(Run.replay_job_id.is_(None))
+
+    if template_id is not None:
+        query = query.filter(Run.template_id == template_id)
+
+    if provider is not None:
+        query = query.filter(Run.provider == provider)
+
+    if validation_status is not None:
+        query = query.filter(Run.validation_status == validation_status)
+
+    return query
+
+
 @router.get("/", response_model=HistoryResponse)
 def get_history(
     template_id: Optional[int] = Query(None, description="Filter by template ID"),
     provider: Optional[str] = Query(None, description="Filter by provider"),
     validation_status: Optional[bool] = Query(None, description="Filter by validation status"),
+    q: Optional[str] = Query(None, description="Full-text search over prompts and raw outputs"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page of search results"),
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
     db: Session = Depends(get_db)
 ):
     """
     Get paginated run history with optional filters.
+    With `q`, runs are ranked by relevance and paged with `cursor` instead of `page`.
     """
     # Build query with filters
-    query = db.query(Run)
-
-    if template_id is not None:
-        query = query.filter(Run.template_id == template_id)
+    query = filter_runs(db.query(Run), template_id, provider, validation_status)
 
-    if provider is not None:
-        query = query.filter(Run.provider == provider)
-
-    if validation_status is not None:
-        query = query.filter(Run.validation_status == validation_status)
+    if q and q.strip():
+        try:
+            runs, next_cursor, truncated = search_runs(query, q, cursor=cursor, limit=page_size)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Counting every match would cost more than the search itself
+        return HistoryResponse(
+            runs=runs,
+            total=None,
+            page=None,
+            page_size=page_size,
+            next_cursor=next_cursor,
+            truncated=truncated
+        )
 
     # Get total count
     total = query.count()
@@ -51,8 +84,6 @@ def get_run(run_id: int, db: Session = Depends(get_db)):
     """
     Get a specific run by ID.
     """
-    from fastapi import HTTPException
-
     run = db.query(Run).filter(Run.id == run_id).first()
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
@@ -0,0 +1,155 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.models.schemas import ReplayCreate, ReplayJobResponse, ReplayReport
+from app.db.database import SessionLocal, get_db
+from app.db.models import ReplayItem, ReplayJob, Run
+from app.routes.history import filter_runs
+from app.services import replay
+
+router = APIRouter()
+
+def _job_response(job: ReplayJob, db: Session) -> ReplayJobResponse:
+    counts = dict(
+        db.query(ReplayItem.status, func.count(ReplayItem.id))
+        .filter(ReplayItem.job_id == job.id)
+        .group_by(ReplayItem.status)
+        .all()
+    )
+    return ReplayJobResponse(
+        id=job.id,
+        provider=job.provider,
+        model=job.model,
+        filters=job.filters or {},
+        status=job.status,
+        concurrency=job.concurrency,
+        requests_per_minute=job.requests_per_minute,
+        total=sum(counts.values()),
+        pending=counts.get("pending", 0),
+        done=counts.get("done", 0),
+        failed=counts.get("failed", 0),
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+
+def _get_job(job_id: int, db: Session) -> ReplayJob:
+    job = db.query(ReplayJob).filter(ReplayJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Replay job not found")
+    return job
+
+
+def _create_job(request: ReplayCreate) -> Optional[ReplayJobResponse]:
+    """Select the source runs and insert the job and its items; None if no runs match."""
+    db = SessionLocal()
+    try:
+        filters = request.filters
+        source_ids = [
+            run_id for (run_id,) in filter_runs(
+                db.query(Run.id),
+                filters.template_id,
+                filters.provider,
+                filters.validation_status
+            ).order_by(Run.created_at.desc()).limit(request.limit)
+        ]
+        if not source_ids:
+            return None
+
+        job = ReplayJob(
+            provider=request.provider,
+            model=request.model,
+            filters=filters.model_dump(),
+            temperature=request.temperature,
+            concurrency=request.concurrency,
+            requests_per_minute=request.requests_per_minute,
+            status="pending"
+        )
+        db.add(job)
+        db.flush()
+        db.bulk_insert_mappings(ReplayItem, [
+            {"job_id": job.id, "source_run_id": run_id, "status": "pending"}
+            for run_id in source_ids
+        ])
+        db.commit()
+        db.refresh(job)
+        return _job_response(job, db)
+    finally:
+        db.close()
+
+
+@router.post("/", response_model=ReplayJobResponse, status_code=201)
+async def create_replay_job(request: ReplayCreate):
+    """
+    Create a replay job from the runs matching the history filters and start it.
+    """
+    # Selecting and inserting up to `limit` items would stall the event loop
+    response = await asyncio.to_thread(_create_job, request)
+    if response is None:
+        raise HTTPException(status_code=400, detail="No runs match the given filters")
+
+    replay.start_job(response.id)
+    return response
+
+
+@router.get("/", response_model=List[ReplayJobResponse])
+def list_replay_jobs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    List replay jobs, most recent first.
+    """
+    jobs = db.query(ReplayJob).order_by(ReplayJob.id.desc()).offset(skip).limit(limit).all()
+    return [_job_response(job, db) for job in jobs]
+
+
+@router.get("/{job_id}", response_model=ReplayJobResponse)
+def get_replay_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Get a replay job and its progress.
+    """
+    return _job_response(_get_job(job_id, db), db)
+
+
+@router.get("/{job_id}/report", response_model=ReplayReport)
+def get_replay_report(job_id: int, db: Session = Depends(get_db)):
+    """
+    Get the source-vs-replay comparison. Computed from finished items while the job is still running.
+    """
+    job = _get_job(job_id, db)
+    report = job.report if job.status == "completed" and job.report else replay.build_report(db, job_id)
+    return ReplayReport(job_id=job.id, status=job.status, **report)
+
+
+@router.post("/{job_id}/cancel", response_model=ReplayJobResponse)
+async def cancel_replay_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Stop a replay job. Finished items are kept.
+    """
+    job = _get_job(job_id, db)
+    replay.cancel_job(job_id)
+    if job.status not in ("completed", "failed"):
+        job.status = "cancelled"
+        db.commit()
+    return _job_response(job, db)
+
+
+@router.post("/{job_id}/resume", response_model=ReplayJobResponse)
+async def resume_replay_job(job_id: int, retry_failed: bool = False, db: Session = Depends(get_db)):
+    """
+    Resume a cancelled, failed or interrupted job from its last checkpoint.
+    """
+    job = _get_job(job_id, db)
+    if retry_failed:
+        db.query(ReplayItem).filter(
+            ReplayItem.job_id == job_id,
+            ReplayItem.status == "failed"
+        ).update({"status": "pending", "error": None})
+    job.status = "pending"
+    job.report = None
+    db.commit()
+
+    replay.start_job(job_id)
+    return _job_response(job, db)
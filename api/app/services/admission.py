@@ -0,0 +1,337 @@
+"""
+Admission control in front of LLM providers.
+
+Every generation acquires a ticket before it reaches a provider. Tickets are
+bounded by per-provider and per-model concurrency limits and by token buckets
+for requests/min and tokens/min. Waiting requests are served in priority
+order so interactive playground traffic goes ahead of batch work.
+"""
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.services import metrics
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+DEFAULT_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+# Buckets hold this many seconds of allowance, so a burst can't spend a whole minute at once
+BURST_SECONDS = 10.0
+TOKEN_EWMA_ALPHA = 0.2
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a request waits in the admission queue longer than allowed."""
+
+
+@dataclass
+class ProviderLimits:
+    """Admission limits for a single provider.
+
+    Attributes:
+        max_concurrency: In-flight requests across all models of the provider
+        max_concurrency_per_model: In-flight requests for any one model
+        requests_per_minute: Request rate limit
+        tokens_per_minute: Token rate limit
+    """
+    max_concurrency: int = 16
+    max_concurrency_per_model: int = 8
+    requests_per_minute: float = 500
+    tokens_per_minute: float = 200_000
+
+
+def _limits_from_env(provider: str, defaults: ProviderLimits) -> ProviderLimits:
+    prefix = provider.upper()
+    return ProviderLimits(
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", defaults.max_concurrency)),
+        max_concurrency_per_model=int(os.getenv(f"{prefix}_MAX_CONCURRENCY_PER_MODEL", defaults.max_concurrency_per_model)),
+        requests_per_minute=float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", defaults.requests_per_minute)),
+        tokens_per_minute=float(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", defaults.tokens_per_minute)),
+    )
+
+
+PROVIDER_LIMITS = {
+    "openai": _limits_from_env("openai", ProviderLimits()),
+    "anthropic": _limits_from_env("anthropic", ProviderLimits(
+        max_concurrency=8,
+        max_concurrency_per_model=4,
+        requests_per_minute=50,
+        tokens_per_minute=40_000,
+    )),
+}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    The level may go negative when actual usage turns out higher than the
+    amount reserved up front; the debt is paid back by later refills.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Give back (positive) or charge (negative) tokens after the fact."""
+        self._refill()
+        self.level = min(self.capacity, self.level + delta)
+
+
+@dataclass
+class Ticket:
+    """Admission granted to a single request."""
+    provider: str
+    model: str
+    priority: str
+    estimated_tokens: int
+    queue_ms: float = 0.0
+    tokens_used: Optional[int] = None
+    attempts: int = 1
+
+    def record_usage(self, tokens_used: Optional[int], attempts: int = 1) -> None:
+        """Report actual usage so buckets and the token estimate can be corrected.
+
+        Args:
+            tokens_used: Tokens used by a single provider call
+            attempts: Provider calls made, including enforcement retries
+        """
+        self.tokens_used = tokens_used
+        self.attempts = max(attempts, 1)
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    ticket: Ticket = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    admitted: bool = field(default=False, compare=False)
+
+
+class _ProviderState:
+    def __init__(self, limits: ProviderLimits):
+        self.limits = limits
+        self.active = 0
+        self.active_by_model: Dict[str, int] = {}
+        self.requests = TokenBucket(limits.requests_per_minute)
+        self.tokens = TokenBucket(limits.tokens_per_minute)
+        self.queue: List[_Waiter] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class AdmissionController:
+    """Concurrency, rate and priority gate for provider calls."""
+
+    def __init__(self, limits: Dict[str, ProviderLimits] = PROVIDER_LIMITS):
+        self.limits = limits
+        self._states: Dict[str, _ProviderState] = {}
+        self._token_estimates: Dict[Tuple[str, str], float] = {}
+        self._seq = itertools.count()
+
+    def _state(self, provider: str) -> _ProviderState:
+        if provider not in self._states:
+            limits = self.limits.get(provider)
+            if limits is None:
+                # Providers without built-in limits (e.g. "mock") still honour <PROVIDER>_* overrides
+                limits = _limits_from_env(provider, ProviderLimits())
+            self._states[provider] = _ProviderState(limits)
+        return self._states[provider]
+
+    def estimate_tokens(self, provider: str, model: str, prompt: str = "", max_tokens: Optional[int] = None) -> int:
+        """Expected token usage, learned from past `tokens_used` for this model.
+
+        Falls back to a rough prompt size plus the completion allowance until
+        the model has been seen.
+        """
+        learned = self._token_estimates.get((provider, model))
+        if learned is not None:
+            return int(learned)
+        return len(prompt) // 4 + (max_tokens or 1000)
+
+    def _learn_tokens(self, provider: str, model: str, tokens_used: int) -> None:
+        key = (provider, model)
+        previous = self._token_estimates.get(key)
+        if previous is None:
+            self._token_estimates[key] = float(tokens_used)
+        else:
+            self._token_estimates[key] = previous + TOKEN_EWMA_ALPHA * (tokens_used - previous)
+
+    def _model_has_capacity(self, state: _ProviderState, model: str) -> bool:
+        return state.active_by_model.get(model, 0) < state.limits.max_concurrency_per_model
+
+    def _grant(self, state: _ProviderState, ticket: Ticket) -> None:
+        state.active += 1
+        state.active_by_model[ticket.model] = state.active_by_model.get(ticket.model, 0) + 1
+        state.requests.take(1)
+        state.tokens.take(ticket.estimated_tokens)
+
+    def _dispatch(self, state: _ProviderState) -> None:
+        """Admit as many queued requests as the limits allow, best priority first."""
+        state.queue = [w for w in state.queue if not w.future.done()]
+        state.queue.sort()
+        retry_after = 0.0
+
+        for waiter in list(state.queue):
+            if state.active >= state.limits.max_concurrency:
+                break
+            if not self._model_has_capacity(state, waiter.ticket.model):
+                # Only this model is saturated; lower-priority work on other models may go
+                continue
+            retry_after = max(
+                state.requests.wait_time(1),
+                state.tokens.wait_time(waiter.ticket.estimated_tokens)
+            )
+            if retry_after > 0:
+                # Rate limits are provider-wide, so nobody behind this waiter may jump it
+                break
+            self._grant(state, waiter.ticket)
+            waiter.admitted = True
+            waiter.future.set_result(None)
+            state.queue.remove(waiter)
+
+        if retry_after > 0 and state.queue and state.timer is None:
+            def _wake():
+                state.timer = None
+                self._dispatch(state)
+            state.timer = asyncio.get_running_loop().call_later(retry_after, _wake)
+
+    def _abandon(self, state: _ProviderState, waiter: _Waiter) -> None:
+        if waiter in state.queue:
+            state.queue.remove(waiter)
+        # The abandoned waiter may have been blocking others behind it
+        self._dispatch(state)
+
+    async def acquire(
+        self,
+        provider: str,
+        model: str,
+        priority: str = "interactive",
+        estimated_tokens: Optional[int] = None,
+        timeout: Optional[float] = DEFAULT_QUEUE_TIMEOUT
+    ) -> Ticket:
+        """Wait for admission and return the granted ticket.
+
+        Raises:
+            AdmissionTimeout: If the request is still queued after `timeout` seconds
+        """
+        state = self._state(provider)
+        ticket = Ticket(
+            provider=provider,
+            model=model,
+            priority=priority,
+            estimated_tokens=estimated_tokens if estimated_tokens is not None else self.estimate_tokens(provider, model)
+        )
+        waiter = _Waiter(
+            rank=PRIORITIES.get(priority, len(PRIORITIES)),
+            seq=next(self._seq),
+            ticket=ticket,
+            future=asyncio.get_running_loop().create_future()
+        )
+        state.queue.append(waiter)
+        start = time.perf_counter()
+        self._dispatch(state)
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            # Admission can land in the same loop tick the timeout fires
+            if waiter.admitted:
+                self.release(ticket)
+            else:
+                self._abandon(state, waiter)
+            raise AdmissionTimeout(
+                f"Request queued for more than {timeout:g}s waiting for {provider} capacity"
+            )
+        except BaseException:
+            # Cancelled while queued, or right after being admitted
+            if waiter.admitted:
+                self.release(ticket)
+            else:
+                self._abandon(state, waiter)
+            raise
+        finally:
+            ticket.queue_ms = (time.perf_counter() - start) * 1000
+            metrics.admission_queue_duration.observe(ticket.queue_ms, provider=provider, priority=priority)
+
+        return ticket
+
+    def try_acquire(self, provider: str, model: str, priority: str = "batch", estimated_tokens: Optional[int] = None) -> Optional[Ticket]:
+        """Admit immediately if there is spare capacity and nobody is queued, else return None."""
+        state = self._state(provider)
+        if estimated_tokens is None:
+            estimated_tokens = self.estimate_tokens(provider, model)
+        if (
+            state.queue
+            or state.active >= state.limits.max_concurrency
+            or not self._model_has_capacity(state, model)
+            or state.requests.wait_time(1) > 0
+            or state.tokens.wait_time(estimated_tokens) > 0
+        ):
+            return None
+        ticket = Ticket(provider=provider, model=model, priority=priority, estimated_tokens=estimated_tokens)
+        self._grant(state, ticket)
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        """Return a ticket's slot and reconcile the buckets with actual usage."""
+        state = self._state(ticket.provider)
+        state.active -= 1
+        state.active_by_model[ticket.model] -= 1
+
+        # Enforcement retries are extra provider requests that were never reserved
+        if ticket.attempts > 1:
+            state.requests.adjust(-(ticket.attempts - 1))
+        if ticket.tokens_used is not None:
+            state.tokens.adjust(ticket.estimated_tokens - ticket.tokens_used * ticket.attempts)
+            self._learn_tokens(ticket.provider, ticket.model, ticket.tokens_used)
+
+        self._dispatch(state)
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        provider: str,
+        model: str,
+        priority: str = "interactive",
+        prompt: str = "",
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = DEFAULT_QUEUE_TIMEOUT
+    ):
+        """Hold an admission ticket for the duration of the block."""
+        ticket = await self.acquire(
+            provider,
+            model,
+            priority=priority,
+            estimated_tokens=self.estimate_tokens(provider, model, prompt, max_tokens),
+            timeout=timeout
+        )
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+
+admission_controller = AdmissionController()
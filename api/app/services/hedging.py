@@ -0,0 +1,253 @@
+"""
+Hedged requests for tail-latency control.
+
+A hedged call starts the primary attempt and, if it has not finished once the
+recent latency percentile for that provider/model has elapsed, launches a
+backup attempt on the same or a fallback model. The first valid result wins
+and the other attempt is cancelled.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.db.database import SessionLocal
+from app.db.models import Run
+from app.services.admission import admission_controller
+from app.services.stats import percentile
+
+DEFAULT_HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+DEFAULT_MAX_EXTRA_TOKEN_RATIO = float(os.getenv("HEDGE_MAX_EXTRA_TOKEN_RATIO", "0.1"))
+DEFAULT_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 500
+
+
+@dataclass
+class HedgePolicy:
+    """Opt-in hedging settings for a single generation request.
+
+    Attributes:
+        percentile: Latency percentile after which the backup attempt is launched
+        fallback_provider: Provider for the backup attempt (defaults to the primary's)
+        fallback_model: Model for the backup attempt (defaults to the primary's)
+        max_extra_token_ratio: Cap on hedge token spend as a fraction of primary spend
+        min_samples: Latency samples required before hedging kicks in
+    """
+    percentile: float = DEFAULT_HEDGE_PERCENTILE
+    fallback_provider: Optional[str] = None
+    fallback_model: Optional[str] = None
+    max_extra_token_ratio: float = DEFAULT_MAX_EXTRA_TOKEN_RATIO
+    min_samples: int = DEFAULT_MIN_SAMPLES
+
+
+class LatencyTracker:
+    """Sliding window of recent enforcement latencies per provider/model.
+
+    Windows are seeded from the `runs` table the first time a provider/model
+    pair is seen, then kept up to date from live calls. Samples are end-to-end
+    enforcement times, retries included. A primary cancelled by a winning
+    hedge is recorded at its elapsed time, a lower bound on its latency, so
+    the slow tail doesn't drop out of the window.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def _seed(self, provider: str, model: str) -> Deque[float]:
+        samples: Deque[float] = deque(maxlen=self.window)
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Run.total_latency_ms)
+                .filter(Run.provider == provider, Run.model == model, Run.total_latency_ms.isnot(None))
+                .order_by(Run.id.desc())
+                .limit(self.window)
+                .all()
+            )
+            samples.extend(row.total_latency_ms for row in reversed(rows))
+        except Exception:
+            # History is only a warm start; live samples fill the window anyway
+            pass
+        finally:
+            db.close()
+        return samples
+
+    def samples(self, provider: str, model: str) -> Deque[float]:
+        key = (provider, model)
+        if key not in self._samples:
+            self._samples[key] = self._seed(provider, model)
+        return self._samples[key]
+
+    def record(self, provider: str, model: str, latency_ms: float) -> None:
+        self.samples(provider, model).append(latency_ms)
+
+    def percentile(self, provider: str, model: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        samples = self.samples(provider, model)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return percentile(samples, pct)
+
+    def expected_remaining(self, provider: str, model: str, elapsed_ms: float) -> float:
+        """Mean remaining latency for calls that have already run `elapsed_ms`."""
+        slower = [s for s in self.samples(provider, model) if s > elapsed_ms]
+        if not slower:
+            return 0.0
+        return sum(slower) / len(slower) - elapsed_ms
+
+
+@dataclass
+class HedgeStats:
+    """Process-wide counters for hedged requests."""
+    requests: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    budget_skips: int = 0
+    capacity_skips: int = 0
+    latency_saved_ms: float = 0.0
+    primary_tokens: int = 0
+    extra_tokens: int = 0
+
+    def within_budget(self, policy: HedgePolicy) -> bool:
+        return self.extra_tokens <= policy.max_extra_token_ratio * self.primary_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "budget_skips": self.budget_skips,
+            "capacity_skips": self.capacity_skips,
+            "latency_saved_ms": self.latency_saved_ms,
+            "primary_tokens": self.primary_tokens,
+            "extra_tokens": self.extra_tokens,
+        }
+
+
+latency_tracker = LatencyTracker()
+hedge_stats = HedgeStats()
+
+
+def _tokens(result: Any) -> int:
+    return result.tokens_used or 0
+
+
+async def _timed(provider: str, model: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+    """Run an attempt and feed its wall-clock latency to the tracker."""
+    start = time.perf_counter()
+    result = await attempt()
+    latency_tracker.record(provider, model, (time.perf_counter() - start) * 1000)
+    return result
+
+
+async def run_hedged(
+    primary: Callable[[], Awaitable[Any]],
+    backup: Callable[[], Awaitable[Any]],
+    provider: str,
+    model: str,
+    backup_provider: str,
+    backup_model: str,
+    policy: HedgePolicy,
+    cancelled_cost: int,
+) -> Any:
+    """Run `primary`, hedging with `backup` if it runs past the latency percentile.
+
+    Both callables return a `GenerationResult`. The first result that passed
+    validation is returned; if neither succeeds the
+    first completed result is returned, and if both raised the primary's
+    exception is re-raised.
+
+    Args:
+        primary: Factory for the primary attempt
+        backup: Factory for the backup attempt
+        provider: Primary provider
+        model: Primary model
+        backup_provider: Provider used by `backup`
+        backup_model: Model used by `backup`
+        policy: Hedging settings
+        cancelled_cost: Tokens charged to the budget for an attempt that is
+            cancelled mid-flight, since providers may bill partial output
+    """
+    stats = hedge_stats
+    stats.requests += 1
+    start = time.perf_counter()
+
+    delay_ms = latency_tracker.percentile(provider, model, policy.percentile, policy.min_samples)
+    primary_task = asyncio.create_task(_timed(provider, model, primary))
+    backup_task: Optional[asyncio.Task] = None
+
+    try:
+        if delay_ms is not None:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay_ms / 1000)
+        if delay_ms is None or done:
+            result = await primary_task
+            stats.primary_tokens += _tokens(result)
+            return result
+
+        ticket = None
+        if not stats.within_budget(policy):
+            stats.budget_skips += 1
+        else:
+            # Hedges only use spare capacity; they never queue behind real traffic
+            ticket = admission_controller.try_acquire(backup_provider, backup_model)
+            if ticket is None:
+                stats.capacity_skips += 1
+        if ticket is None:
+            result = await primary_task
+            stats.primary_tokens += _tokens(result)
+            return result
+
+        async def _admitted_backup():
+            try:
+                result = await backup()
+                if result is not None:
+                    ticket.record_usage(result.tokens_used, result.retry_count + 1)
+                return result
+            finally:
+                admission_controller.release(ticket)
+
+        stats.hedges += 1
+        backup_task = asyncio.create_task(_timed(backup_provider, backup_model, _admitted_backup))
+        pending = {primary_task, backup_task}
+        completed: Dict[asyncio.Task, Any] = {}
+        winner: Optional[asyncio.Task] = None
+
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    continue
+                completed[task] = task.result()
+                if winner is None and completed[task].validation_status:
+                    winner = task
+    finally:
+        # Also reached when the caller is cancelled; no attempt may outlive the request
+        for task in (primary_task, backup_task):
+            if task is not None and not task.done():
+                task.cancel()
+                if task is primary_task and backup_task is not None:
+                    # Censored sample: the primary would have taken at least this long
+                    latency_tracker.record(provider, model, (time.perf_counter() - start) * 1000)
+
+    if winner is None:
+        if not completed:
+            # Both attempts raised; surface the primary's error
+            stats.extra_tokens += cancelled_cost
+            raise primary_task.exception()
+        # Neither validated; keep the first completed result
+        winner = primary_task if primary_task in completed else backup_task
+
+    loser = backup_task if winner is primary_task else primary_task
+    stats.primary_tokens += _tokens(completed[winner])
+    stats.extra_tokens += _tokens(completed[loser]) if loser in completed else cancelled_cost
+
+    # A backup that merely finished first without validating saved nothing
+    if winner is backup_task and completed[winner].validation_status:
+        stats.hedge_wins += 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        stats.latency_saved_ms += latency_tracker.expected_remaining(provider, model, elapsed_ms)
+
+    return completed[winner]
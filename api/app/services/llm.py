@@ -1,11 +1,50 @@
 """
 LLM service 
+
+Parsec and the provider SDKs are imported on first use rather than at module
+load; the SDKs alone take seconds to import and would slow every worker's
+cold start. `warm_imports` loads them in the background once the worker is
+up, so the first generate request doesn't pay for them either.
 """
+import asyncio
+import importlib
 import os
-from typing import Tuple, Any
-from parsec.enforcement.engine import EnforcementEngine
-from parsec.models.adapters import OpenAIAdapter, AnthropicAdapter
-from parsec.validators import JSONValidator
+import time
+from typing import Any, NamedTuple, Optional
+
+from app.services import metrics, timing
+from app.services.hedging import HedgePolicy, latency_tracker, run_hedged
+from app.services.retry_policy import build_repair_prompt, retry_budget
+from app.services.token_budget import MAX_MAX_TOKENS, estimate_max_tokens
+
+DEFAULT_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "120000"))
+WARM_IMPORTS = (
+    "parsec.core",
+    "parsec.validators",
+    "parsec.resilience.backoff",
+    "parsec.resilience.retry",
+    "parsec.models.adapters.openai_adapter",
+    "parsec.models.adapters.anthropic_adapter",
+    "parsec.enforcement.streaming_engine",
+    "app.services.repair",
+    "app.services.mock_llm",
+)
+
+
+class GenerationResult(NamedTuple):
+    """Outcome of an enforced generation."""
+    parsed_output: Any
+    raw_output: str
+    validation_status: bool
+    validation_errors: list
+    latency_ms: float
+    tokens_used: int
+    retry_count: int
+    repair_count: int = 0
+    total_latency_ms: float = 0.0
+    max_tokens: Optional[int] = None
+    truncation_retries: int = 0
+
 
 def create_adapter(provider: str, model: str, api_key: str = None) -> Any:
     """Create and return the appropriate LLM adapter based on provider.
@@ -19,27 +58,185 @@ def create_adapter(provider: str, model: str, api_key: str = None) -> Any:
         key = api_key or os.getenv("OPENAI_API_KEY", "").strip()
         if not key:
             raise ValueError("OpenAI API key is required. Please provide an API key or set OPENAI_API_KEY in environment.")
+        from parsec.models.adapters.openai_adapter import OpenAIAdapter
         return OpenAIAdapter(model=model, api_key=key)
     elif provider == "anthropic":
         key = api_key or os.getenv("ANTHROPIC_API_KEY", "").strip()
         if not key:
             raise ValueError("Anthropic API key is required. Please provide an API key or set ANTHROPIC_API_KEY in environment.")
+        from parsec.models.adapters.anthropic_adapter import AnthropicAdapter
         return AnthropicAdapter(model=model, api_key=key)
+    elif provider == "mock":
+        from app.services.mock_llm import MockAdapter, mock_enabled
+        if not mock_enabled():
+            raise ValueError(f"Unsupported provider: {provider}")
+        return MockAdapter(model=model)
     # elif provider == "gemini":
     #     return GeminiAdapter(model=model, api_key=os.getenv("GOOGLE_API_KEY"))
     else:
         raise ValueError(f"Unsupported provider: {provider}")
 
 
+def _import_modules() -> None:
+    for name in WARM_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # A missing optional SDK is reported by the request that needs it
+            pass
+
+
+async def warm_imports() -> None:
+    """Import the lazily loaded generation modules in a worker thread."""
+    await asyncio.to_thread(_import_modules)
+
+
+async def _enforce(
+    provider: str,
+    model: str,
+    prompt: str,
+    schema: dict,
+    temperature: float,
+    max_tokens: int,
+    api_key: str = None,
+    max_retries: int = 3,
+    deadline: Optional[float] = None
+) -> GenerationResult:
+    """Generate and validate against one provider/model, retrying on failure.
+
+    Failed validations are retried with an error-focused repair prompt rather
+    than a full re-ask. Output cut off by the token limit is retried with
+    the limit doubled, since the same limit would truncate again; it is only
+    closed off by local repair once the limit can't grow. No attempt is
+    started, and no backoff slept, once the deadline would be missed; the
+    last invalid output is returned instead, or the last provider error
+    raised if there is none.
+
+    Args:
+        max_retries: Retry budget for this request
+        deadline: Absolute `time.perf_counter()` value by which to finish
+    """
+    from parsec.core import ValidationStatus
+    from parsec.resilience.backoff import ExponentialBackoff
+    from parsec.resilience.retry import DEFAULT_POLICIES, OperationType
+    from app.services.repair import RepairingValidator, is_truncated
+
+    start = time.perf_counter()
+    target = f"{provider}/{model}"
+    with timing.span("adapter", target):
+        adapter = create_adapter(provider, model, api_key)
+    # Local repair runs on every attempt, so a retry is only spent when it fails
+    validator = RepairingValidator()
+    policy = DEFAULT_POLICIES[OperationType.GENERATION]
+    backoff = ExponentialBackoff(base=policy.base_delay, max_delay=policy.max_delay, jitter=True)
+
+    attempt_prompt = prompt
+    attempt_max_tokens = max_tokens
+    retry_count = 0
+    truncation_retries = 0
+    # Set when the previous attempt was cut off, so the next one runs with a doubled limit
+    retry_truncated = False
+    generation = None
+    generation_max_tokens = max_tokens
+    validation = None
+    last_error: Optional[Exception] = None
+    attempt_ms = 0.0
+
+    for attempt in range(max_retries + 1):
+        remaining = (deadline - time.perf_counter()) if deadline is not None else policy.timeout
+        # Don't start an attempt the previous one suggests can't finish in time
+        if generation is not None and remaining * 1000 < attempt_ms:
+            break
+        if remaining <= 0:
+            break
+
+        # Retries are only counted once they are actually sent
+        if attempt > 0:
+            retry_count += 1
+            if retry_truncated:
+                truncation_retries += 1
+                retry_truncated = False
+        attempt_start = time.perf_counter()
+        try:
+            with timing.span(f"llm_{attempt + 1}", target):
+                attempt_generation = await asyncio.wait_for(
+                    adapter.generate(attempt_prompt, schema, temperature=temperature, max_tokens=attempt_max_tokens),
+                    timeout=min(remaining, policy.timeout)
+                )
+        except Exception as e:
+            metrics.llm_request_duration.observe(
+                (time.perf_counter() - attempt_start) * 1000, provider=provider, model=model, outcome="error"
+            )
+            if not policy.is_retryable(e) or attempt >= max_retries:
+                raise
+            last_error = e
+            delay = backoff.calculate(attempt)
+            # A retry that could only start after the deadline isn't worth waiting for
+            if deadline is not None and delay >= deadline - time.perf_counter():
+                break
+            with timing.span(f"backoff_{attempt + 1}", target):
+                await asyncio.sleep(delay)
+            continue
+        attempt_ms = (time.perf_counter() - attempt_start) * 1000
+        metrics.observe_generation(provider, model, attempt_ms, attempt_generation.tokens_used)
+
+        generation = attempt_generation
+        generation_max_tokens = attempt_max_tokens
+        with timing.span(f"validate_{attempt + 1}", target):
+            validation = validator.validate_and_repair(
+                generation.output,
+                schema,
+                # Cut-off output is a truncation failure, not a repair, while the limit can still grow
+                repair_truncated=not attempt_max_tokens or attempt_max_tokens >= MAX_MAX_TOKENS
+            )
+        if validation.status == ValidationStatus.VALID:
+            break
+
+        if attempt < max_retries:
+            attempt_prompt = build_repair_prompt(prompt, generation.output, validation.errors)
+            if attempt_max_tokens and is_truncated(generation.output):
+                retry_truncated = True
+                attempt_max_tokens = min(attempt_max_tokens * 2, max(MAX_MAX_TOKENS, attempt_max_tokens))
+
+    if generation is None:
+        if last_error is not None:
+            raise last_error
+        raise TimeoutError(f"No response from {provider}/{model} before the request deadline")
+
+    success = validation.status == ValidationStatus.VALID
+    metrics.enforcement_retries.observe(retry_count, provider=provider, model=model)
+    if validator.repair_hits:
+        metrics.local_repairs.inc(validator.repair_hits, provider=provider, model=model)
+    return GenerationResult(
+        parsed_output=validation.parsed_output,
+        raw_output=generation.output,
+        validation_status=success,
+        validation_errors=[
+            {"path": err.path, "message": err.message}
+            for err in (validation.errors or [])
+        ],
+        latency_ms=generation.latency_ms,
+        tokens_used=generation.tokens_used,
+        retry_count=retry_count,
+        repair_count=validator.repair_hits,
+        total_latency_ms=(time.perf_counter() - start) * 1000,
+        max_tokens=generation_max_tokens,
+        truncation_retries=truncation_retries
+    )
+
+
 async def generate_with_enforcement(
     provider: str,
     model: str,
     prompt: str,
     schema: dict,
     temperature: float = 0.7,
-    max_tokens: int = 1000,
-    api_key: str = None
-) -> Tuple[Any, str, bool, list, float, int, int]:
+    max_tokens: Optional[int] = None,
+    api_key: str = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    template_id: Optional[int] = None,
+    deadline_ms: Optional[float] = None
+) -> GenerationResult:
     """Generate output using the specified LLM with schema enforcement.
 
     Args:
@@ -48,42 +245,49 @@ async def generate_with_enforcement(
         prompt: The input prompt
         schema: JSON schema for validation
         temperature: Generation temperature
-        max_tokens: Maximum tokens to generate
+        max_tokens: Maximum tokens to generate. Estimated from the schema and
+            the template's past runs when not given.
         api_key: Optional user-provided API key
+        hedge_policy: Optional hedging settings. When set, a backup attempt is
+            launched if the call runs past the recent latency percentile.
+        template_id: Template the prompt came from, used to pick the retry budget
+        deadline_ms: Overall time allowed for all attempts
     """
-    adapter = create_adapter(provider, model, api_key)
-    validator = JSONValidator()
-    engine = EnforcementEngine(
-        adapter=adapter,
-        validator=validator,
-        max_retries=3
-    )
+    deadline = time.perf_counter() + (DEFAULT_DEADLINE_MS if deadline_ms is None else deadline_ms) / 1000
+    if max_tokens is None:
+        max_tokens = estimate_max_tokens(schema, template_id)
 
-    result = await engine.enforce(
-        prompt=prompt,
-        schema=schema,
-        temperature=temperature,
-        max_tokens=max_tokens
-    )
+    def attempt(attempt_provider: str, attempt_model: str, attempt_key: Optional[str]):
+        with timing.span("retry_budget", f"{attempt_provider}/{attempt_model}"):
+            max_retries = retry_budget(template_id, attempt_model)
+        return _enforce(
+            attempt_provider,
+            attempt_model,
+            prompt,
+            schema,
+            temperature,
+            max_tokens,
+            api_key=attempt_key,
+            max_retries=max_retries,
+            deadline=deadline
+        )
+
+    if hedge_policy is None:
+        result = await attempt(provider, model, api_key)
+        latency_tracker.record(provider, model, result.total_latency_ms)
+        return result
 
-    raw_output = result.generation.output
-    parsed_output = result.data
-    validation_status = result.success
-    validation_errors = [
-        {"path": err.path, "message": err.message} 
-        for err in (result.validation.errors or [])
-    ]
-    latency_ms = result.generation.latency_ms
-    tokens_used = result.generation.tokens_used
-    retry_count = result.retry_count
-
-
-    return (
-        parsed_output,
-        raw_output,
-        validation_status,
-        validation_errors,
-        latency_ms,
-        tokens_used,
-        retry_count
+    backup_provider = hedge_policy.fallback_provider or provider
+    backup_model = hedge_policy.fallback_model or model
+    # A user-supplied key only applies to the provider it was issued for
+    backup_key = api_key if backup_provider == provider else None
+    return await run_hedged(
+        primary=lambda: attempt(provider, model, api_key),
+        backup=lambda: attempt(backup_provider, backup_model, backup_key),
+        provider=provider,
+        model=model,
+        backup_provider=backup_provider,
+        backup_model=backup_model,
+        policy=hedge_policy,
+        cancelled_cost=max_tokens
     )
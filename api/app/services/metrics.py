@@ -0,0 +1,276 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Histograms use fixed buckets so an observation is a bisect plus a few list
+increments. Updates take no locks: the event loop and the threadpool serving
+sync routes only interleave at bytecode boundaries, so a concurrent update
+can very rarely be lost, which is an accepted trade-off for keeping metrics
+on in production. Only creating a new label combination is locked.
+"""
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+FAST_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+RETRY_BUCKETS = (0, 1, 2, 3, 5)
+TOKEN_RATE_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800, 1600)
+LOOP_LAG_INTERVAL_S = 0.5
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _child(self, labels: Dict[str, str]):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return [0.0]
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self._child(labels)[0] += amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {value[0]}"
+            for key, value in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self._child(labels)[0] -= amount
+
+    def set(self, value: float, **labels) -> None:
+        self._child(labels)[0] = value
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        # One slot per bucket plus +Inf; cumulated only when rendering
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        super().__init__(name, documentation, labels)
+        # A repeated bound would render two series with the same `le` label
+        self.buckets = tuple(sorted(set(buckets)))
+
+    def _new_child(self):
+        return _HistogramChild(len(self.buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        child = self._child(labels)
+        child.counts[bisect_left(self.buckets, value)] += 1
+        child.sum += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), child.counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_ms", "HTTP request latency by route", ["method", "route", "status"]
+))
+llm_request_duration = registry.register(Histogram(
+    "llm_request_duration_ms", "Latency of single LLM provider calls", ["provider", "model", "outcome"]
+))
+llm_tokens_per_second = registry.register(Histogram(
+    "llm_tokens_per_second", "Token throughput of single LLM provider calls", ["provider", "model"], TOKEN_RATE_BUCKETS
+))
+llm_time_to_first_token = registry.register(Histogram(
+    "llm_time_to_first_token_ms", "Time until a streamed LLM provider call returns its first chunk", ["provider", "model"]
+))
+llm_tokens = registry.register(Counter(
+    "llm_tokens_total", "Tokens used by LLM provider calls", ["provider", "model"]
+))
+enforcement_retries = registry.register(Histogram(
+    "enforcement_retries", "Retries spent per enforced generation", ["provider", "model"], RETRY_BUCKETS
+))
+local_repairs = registry.register(Counter(
+    "local_repair_hits_total", "Outputs fixed by local JSON repair instead of an LLM retry", ["provider", "model"]
+))
+generation_failures = registry.register(Counter(
+    "generation_failures_total", "Generations that raised before a run was saved", ["provider", "model", "error"]
+))
+admission_queue_duration = registry.register(Histogram(
+    "admission_queue_duration_ms", "Time spent waiting for admission", ["provider", "priority"], sorted(set(FAST_BUCKETS_MS + LATENCY_BUCKETS_MS[6:]))
+))
+db_commit_duration = registry.register(Histogram(
+    "db_commit_duration_ms", "Database commit latency", buckets=FAST_BUCKETS_MS
+))
+event_loop_lag = registry.register(Histogram(
+    "event_loop_lag_ms", "Delay of the event loop waking a timer", buckets=FAST_BUCKETS_MS
+))
+active_websocket_streams = registry.register(Gauge(
+    "active_websocket_streams", "WebSocket streams currently open"
+))
+
+
+def observe_generation(provider: str, model: str, latency_ms: float, tokens_used: Optional[int]) -> None:
+    """Record a successful provider call."""
+    llm_request_duration.observe(latency_ms, provider=provider, model=model, outcome="ok")
+    if tokens_used:
+        llm_tokens.inc(tokens_used, provider=provider, model=model)
+        if latency_ms > 0:
+            llm_tokens_per_second.observe(tokens_used / (latency_ms / 1000), provider=provider, model=model)
+
+
+def observe_stream(provider: str, model: str, latency_ms: float, output_tokens: int) -> None:
+    """Record a completed streaming provider call.
+
+    Streams don't report usage, so the token rate is based on an estimate of
+    the output tokens and the call is left out of `llm_tokens_total`.
+    """
+    llm_request_duration.observe(latency_ms, provider=provider, model=model, outcome="ok")
+    if output_tokens and latency_ms > 0:
+        llm_tokens_per_second.observe(output_tokens / (latency_ms / 1000), provider=provider, model=model)
+
+
+def _route_template(scope) -> str:
+    """Path template of the matched route, e.g. `/api/history/{run_id}`.
+
+    Routes of included routers may only know their path relative to the
+    router prefix, so the prefix is recovered from the concrete request path.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = getattr(route, "path_format", None) or route.path
+    try:
+        concrete = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope["path"]
+    if concrete and path.endswith(concrete):
+        return path[:len(path) - len(concrete)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests until their last body chunk is sent.
+
+    Timing to the end of the body (rather than to the first header) keeps
+    streaming responses such as the compare endpoint honest.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                (time.perf_counter() - start) * 1000,
+                method=scope["method"],
+                route=_route_template(scope),
+                status=status["code"]
+            )
+
+
+def install_db_timing(session_factory) -> None:
+    """Time commits of sessions created by `session_factory`."""
+    from sqlalchemy import event
+
+    @event.listens_for(session_factory, "before_commit")
+    def _before_commit(session):
+        session.info["commit_started"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def _after_commit(session):
+        started = session.info.pop("commit_started", None)
+        if started is not None:
+            db_commit_duration.observe((time.perf_counter() - started) * 1000)
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL_S) -> None:
+    """Sample how late the event loop runs a timer; run as a background task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(loop.time() - expected, 0.0) * 1000)
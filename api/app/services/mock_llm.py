@@ -0,0 +1,167 @@
+"""
+Deterministic mock LLM provider for benchmarks.
+
+Available as provider "mock" when ENABLE_MOCK_PROVIDER is set. Outputs are
+generated from the request's JSON schema; latency, token rate and the share
+of invalid (truncated) outputs are configured through environment variables.
+Every random choice is seeded from the request itself, so the same prompt
+produces the same output and timing regardless of request interleaving.
+"""
+import asyncio
+import json
+import os
+import random
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Optional
+
+from parsec.core import BaseLLMAdapter, GenerationResponse
+
+CHARS_PER_TOKEN = 4
+# Tokens per streamed chunk
+STREAM_CHUNK_TOKENS = 4
+MAX_SCHEMA_DEPTH = 8
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet")
+
+
+class MockProvider(Enum):
+    MOCK = "mock"
+
+
+def mock_enabled() -> bool:
+    return os.getenv("ENABLE_MOCK_PROVIDER", "").lower() in ("1", "true", "yes")
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock provider.
+
+    Attributes:
+        latency_ms: Typical time before the first token
+        latency_distribution: "fixed", "uniform" (latency_ms +/- spread) or "lognormal" (sigma = spread)
+        latency_spread: Spread of the latency distribution
+        tokens_per_second: Output token rate; 0 returns the whole output at once
+        invalid_rate: Share of outputs cut off mid-JSON
+        seed: Base seed mixed into every request
+    """
+    latency_ms: float = 200.0
+    latency_distribution: str = "lognormal"
+    latency_spread: float = 0.5
+    tokens_per_second: float = 100.0
+    invalid_rate: float = 0.0
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        return cls(
+            latency_ms=float(os.getenv("MOCK_LATENCY_MS", cls.latency_ms)),
+            latency_distribution=os.getenv("MOCK_LATENCY_DISTRIBUTION", cls.latency_distribution),
+            latency_spread=float(os.getenv("MOCK_LATENCY_SPREAD", cls.latency_spread)),
+            tokens_per_second=float(os.getenv("MOCK_TOKENS_PER_SECOND", cls.tokens_per_second)),
+            invalid_rate=float(os.getenv("MOCK_INVALID_RATE", cls.invalid_rate)),
+            seed=int(os.getenv("MOCK_SEED", cls.seed)),
+        )
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        """Seconds before the first token."""
+        if self.latency_distribution == "uniform":
+            spread = self.latency_ms * self.latency_spread
+            delay = rng.uniform(self.latency_ms - spread, self.latency_ms + spread)
+        elif self.latency_distribution == "lognormal":
+            # latency_ms is the median
+            delay = self.latency_ms * rng.lognormvariate(0.0, self.latency_spread)
+        else:
+            delay = self.latency_ms
+        return max(delay, 0.0) / 1000
+
+
+def sample_value(schema: Any, rng: random.Random, depth: int = 0) -> Any:
+    """Build a value matching `schema`."""
+    if not isinstance(schema, dict) or depth > MAX_SCHEMA_DEPTH:
+        return rng.choice(WORDS)
+
+    if "enum" in schema and schema["enum"]:
+        return rng.choice(schema["enum"])
+    if "const" in schema:
+        return schema["const"]
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if schema.get(combinator):
+            return sample_value(schema[combinator][0], rng, depth + 1)
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "null")
+
+    if schema_type == "object" or "properties" in schema:
+        return {key: sample_value(sub, rng, depth + 1) for key, sub in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        count = max(schema.get("minItems", 0), min(schema.get("maxItems", 3), 3))
+        return [sample_value(schema.get("items"), rng, depth + 1) for _ in range(count)]
+    if schema_type == "integer":
+        return rng.randint(int(schema.get("minimum", 0)), int(schema.get("maximum", 100)))
+    if schema_type == "number":
+        return round(rng.uniform(schema.get("minimum", 0), schema.get("maximum", 100)), 2)
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    if schema_type == "null":
+        return None
+    if schema.get("format") == "email":
+        return f"{rng.choice(WORDS)}@example.com"
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    if "maxLength" in schema:
+        text = text[:schema["maxLength"]]
+    return text.ljust(schema.get("minLength", 0), "x")
+
+
+class MockAdapter(BaseLLMAdapter):
+    """Adapter that simulates a provider without network calls."""
+
+    provider = MockProvider.MOCK
+
+    def __init__(self, model: str, config: Optional[MockConfig] = None):
+        super().__init__(api_key="mock", model=model)
+        self.mock_config = config or MockConfig.from_env()
+
+    def supports_native_structure_output(self) -> bool:
+        return True
+
+    def supports_streaming(self) -> bool:
+        return True
+
+    def _respond(self, prompt: str, schema: Optional[Dict[str, Any]], temperature: float, max_tokens: Optional[int]):
+        rng = random.Random(f"{self.mock_config.seed}:{self.model}:{temperature}:{prompt}")
+        output = json.dumps(sample_value(schema or {"type": "object"}, rng))
+        if max_tokens and len(output) > max_tokens * CHARS_PER_TOKEN:
+            output = output[:max_tokens * CHARS_PER_TOKEN]
+        elif rng.random() < self.mock_config.invalid_rate:
+            output = output[:rng.randint(1, max(len(output) - 1, 1))]
+        return output, self.mock_config.first_token_delay(rng)
+
+    def _token_delay(self, text: str) -> float:
+        if self.mock_config.tokens_per_second <= 0:
+            return 0.0
+        return len(text) / CHARS_PER_TOKEN / self.mock_config.tokens_per_second
+
+    def _tokens_used(self, prompt: str, output: str) -> int:
+        return (len(prompt) + len(output)) // CHARS_PER_TOKEN
+
+    async def generate(self, prompt: str, schema: Optional[Dict[str, Any]] = None, temperature: float = 0.7, max_tokens: Optional[int] = None, **kwargs) -> GenerationResponse:
+        output, delay = self._respond(prompt, schema, temperature, max_tokens)
+        delay += self._token_delay(output)
+        await asyncio.sleep(delay)
+        return GenerationResponse(
+            output=output,
+            provider=self.provider.value,
+            model=self.model,
+            tokens_used=self._tokens_used(prompt, output),
+            latency_ms=delay * 1000
+        )
+
+    async def generate_stream(self, prompt: str, schema: Optional[Dict[str, Any]] = None, temperature: float = 0.7, max_tokens: Optional[int] = None, **kwargs) -> AsyncIterator[str]:
+        output, delay = self._respond(prompt, schema, temperature, max_tokens)
+        await asyncio.sleep(delay)
+        step = STREAM_CHUNK_TOKENS * CHARS_PER_TOKEN
+        for i in range(0, len(output), step):
+            chunk = output[i:i + step]
+            await asyncio.sleep(self._token_delay(chunk))
+            yield chunk
@@ -0,0 +1,297 @@
+"""
+Deterministic local repair of malformed JSON output.
+
+Runs before the enforcement engine spends an LLM retry: strips code fences
+and surrounding prose, fixes common syntax slips (single quotes, Python
+literals, trailing commas, comments, unquoted keys), closes structures cut
+off by max_tokens and coerces simple type mismatches against the schema.
+"""
+import json
+import re
+from typing import Any, List, Optional
+
+from parsec.validators import JSONValidator, ValidationResult, ValidationStatus
+
+LITERALS = {
+    "true": "true", "false": "false", "null": "null",
+    "True": "true", "False": "false", "None": "null",
+    "NaN": "null", "Infinity": "null", "undefined": "null",
+}
+NUMBER_START = set("0123456789+-.")
+NUMBER_CHARS = NUMBER_START | set("eE")
+MAX_TRIM_STEPS = 8
+_JSON_NUMBER = re.compile(r"^-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$")
+_LOOSE_NUMBER = re.compile(r"^([+-]?)(\d*)(?:\.(\d*))?(?:[eE]([+-]?\d+))?$")
+
+
+def _read_string(text: str, i: int) -> tuple:
+    """Read a single- or double-quoted string starting at `i` and re-emit it double-quoted.
+
+    Unterminated strings (truncated output) are closed at the end of input.
+    """
+    quote = text[i]
+    n = len(text)
+    buf: List[str] = []
+    j = i + 1
+    while j < n:
+        c = text[j]
+        if c == "\\":
+            if j + 1 >= n:
+                break
+            nxt = text[j + 1]
+            buf.append("'" if (quote == "'" and nxt == "'") else c + nxt)
+            j += 2
+            continue
+        if c == quote:
+            j += 1
+            break
+        if c == '"':
+            buf.append('\\"')
+        elif c == "\n":
+            buf.append("\\n")
+        elif c == "\t":
+            buf.append("\\t")
+        else:
+            buf.append(c)
+        j += 1
+    return '"' + "".join(buf) + '"', j
+
+
+def _normalize_number(token: str) -> str:
+    """Rewrite a loosely written number (`.5`, `+1`, `1.`, `007`) as valid JSON.
+
+    Tokens that aren't numbers at all (a lone `-`, `1e`) are returned
+    unchanged and fail to parse.
+    """
+    if _JSON_NUMBER.match(token):
+        return token
+    match = _LOOSE_NUMBER.match(token)
+    if not match or not (match.group(2) or match.group(3)):
+        return token
+    sign, whole, fraction, exponent = match.groups()
+    number = ("-" if sign == "-" else "") + (whole.lstrip("0") or "0")
+    if fraction:
+        number += "." + fraction
+    if exponent is not None:
+        number += "e" + exponent
+    return number
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split the first JSON-looking value in `text` into normalized tokens."""
+    starts = [pos for pos in (text.find("{"), text.find("[")) if pos != -1]
+    i = min(starts) if starts else 0
+    n = len(text)
+    tokens: List[str] = []
+    depth = 0
+
+    while i < n:
+        ch = text[i]
+        if ch.isspace():
+            i += 1
+        elif ch in "\"'":
+            token, i = _read_string(text, i)
+            tokens.append(token)
+        elif ch in "{[":
+            depth += 1
+            tokens.append(ch)
+            i += 1
+        elif ch in "}]":
+            i += 1
+            if depth == 0:
+                continue
+            depth -= 1
+            tokens.append(ch)
+            if depth == 0:
+                # Anything after the top-level value is prose or a closing fence
+                break
+        elif ch in ",:":
+            tokens.append(ch)
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif ch in NUMBER_START:
+            j = i
+            while j < n and text[j] in NUMBER_CHARS:
+                j += 1
+            tokens.append(_normalize_number(text[i:j]))
+            i = j
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in "_$"):
+                j += 1
+            word = text[i:j]
+            rest = text[j:].lstrip()
+            if rest.startswith(":"):
+                tokens.append(json.dumps(word))  # unquoted key
+            elif word in LITERALS:
+                tokens.append(LITERALS[word])
+            else:
+                tokens.append(json.dumps(word))
+            i = j
+        elif ch == "`":
+            # Stray backticks from a half-stripped fence
+            i += 1
+        else:
+            tokens.append(ch)
+            i += 1
+
+    return tokens
+
+
+def _assemble(tokens: List[str]) -> str:
+    """Join tokens, dropping trailing commas and closing any open structures."""
+    out: List[str] = []
+    stack: List[str] = []
+    for index, token in enumerate(tokens):
+        if token == ",":
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if following is None or following in "}]" or (out and out[-1] in ",[{"):
+                continue
+        if token in "{[":
+            stack.append("}" if token == "{" else "]")
+        elif token in "}]":
+            if stack:
+                stack.pop()
+        out.append(token)
+    out.extend(reversed(stack))
+    return " ".join(out)
+
+
+def _parse(text: str) -> Any:
+    """Parse `text`, dropping trailing tokens of a truncated value until it loads.
+
+    Only output cut off mid-value is trimmed; a complete value that still
+    doesn't parse is rejected rather than losing fields.
+
+    Raises:
+        ValueError: If the text can't be turned into JSON
+    """
+    tokens = _tokenize(text)
+    trim_steps = MAX_TRIM_STEPS if is_truncated(text) else 0
+    for _ in range(trim_steps + 1):
+        if not tokens:
+            break
+        try:
+            return json.loads(_assemble(tokens))
+        except json.JSONDecodeError:
+            tokens = tokens[:-1]
+    raise ValueError("Output could not be repaired into JSON")
+
+
+def _coerce(value: Any, schema: Any) -> Any:
+    """Coerce simple scalar/array mismatches to the type the schema expects."""
+    if not isinstance(schema, dict):
+        return value
+
+    expected = schema.get("type")
+    if isinstance(expected, list):
+        for option in expected:
+            coerced = _coerce(value, {**schema, "type": option})
+            if coerced is not value:
+                return coerced
+        return value
+
+    if expected == "object" and isinstance(value, dict):
+        properties = schema.get("properties", {})
+        return {key: _coerce(item, properties.get(key)) for key, item in value.items()}
+    if expected == "array":
+        items = schema.get("items")
+        if not isinstance(value, list):
+            value = [value]
+        return [_coerce(item, items) for item in value]
+    if expected == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if expected in ("integer", "number") and isinstance(value, str) and _JSON_NUMBER.match(_normalize_number(value.strip())):
+        number = float(_normalize_number(value.strip()))
+        return int(number) if expected == "integer" or number.is_integer() else number
+    if expected == "integer" and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if expected == "boolean" and isinstance(value, str) and value.strip().lower() in ("true", "false", "yes", "no"):
+        return value.strip().lower() in ("true", "yes")
+    if expected == "boolean" and value in (0, 1) and not isinstance(value, bool):
+        return bool(value)
+    return value
+
+
+def is_truncated(output: str) -> bool:
+    """Whether the output stops inside an unterminated string, object or array."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for ch in output:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth = max(depth - 1, 0)
+    return in_string or depth > 0
+
+
+def repair_json(output: str, schema: dict) -> Optional[Any]:
+    """Try to turn malformed LLM output into a value matching `schema`.
+
+    Args:
+        output: Raw model output
+        schema: JSON schema the output should conform to
+
+    Returns:
+        The repaired value, or None if the output couldn't be parsed
+    """
+    try:
+        parsed = _parse(output)
+    except ValueError:
+        return None
+    return _coerce(parsed, schema)
+
+
+class RepairingValidator(JSONValidator):
+    """JSONValidator that runs the local repair pass before a retry is spent.
+
+    `repair_hits` counts outputs that failed validation as returned by the
+    model but passed after local repair.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.repair_hits = 0
+
+    def validate_and_repair(self, output: str, schema: dict, max_repair_attempts: int = 2, repair_truncated: bool = True) -> ValidationResult:
+        """Validate `output`, falling back to local repair.
+
+        Args:
+            repair_truncated: Whether to close output cut off mid-value. Pass
+                False when a retry with a higher token limit can still fetch
+                the complete answer; a closed-off value would pass validation
+                with missing or partial content.
+        """
+        result = self.validate(output, schema)
+        if result.status == ValidationStatus.VALID:
+            return result
+        if not repair_truncated and is_truncated(output):
+            return result
+
+        repaired = repair_json(output, schema)
+        if repaired is not None:
+            repaired_result = self.validate(json.dumps(repaired), schema)
+            if repaired_result.status == ValidationStatus.VALID:
+                repaired_result.raw_output = output
+                repaired_result.repair_attempted = True
+                repaired_result.repair_successful = True
+                self.repair_hits += 1
+                return repaired_result
+
+        result.repair_attempted = True
+        return result
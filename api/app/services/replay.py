@@ -0,0 +1,211 @@
+"""
+Replay jobs: re-run historical prompts against a new provider/model.
+
+Progress is checkpointed per item in `replay_items`, so a job interrupted by
+a crash or restart picks up its remaining items instead of starting over.
+Items are processed at-least-once: an item whose run was saved but whose
+status update was lost is replayed again on resume.
+"""
+import asyncio
+import logging
+from typing import Dict, List
+
+from sqlalchemy.orm import joinedload
+
+from app.db.database import SessionLocal
+from app.db.models import ReplayItem, ReplayJob, Run
+from app.services.admission import TokenBucket
+from app.services.runner import execute_run
+from app.services.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# Pending items loaded into the work queue at a time
+BATCH_SIZE = 500
+
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def start_job(job_id: int) -> None:
+    """Schedule a job on the running event loop (no-op if it is already running)."""
+    task = _tasks.get(job_id)
+    if task is not None and not task.done():
+        return
+    _tasks[job_id] = asyncio.create_task(run_job(job_id))
+
+
+def cancel_job(job_id: int) -> None:
+    task = _tasks.pop(job_id, None)
+    if task is not None:
+        task.cancel()
+
+
+def resume_jobs() -> List[int]:
+    """Restart jobs that were still running when the process last stopped."""
+    db = SessionLocal()
+    try:
+        job_ids = [job_id for (job_id,) in db.query(ReplayJob.id).filter(ReplayJob.status == "running")]
+    finally:
+        db.close()
+    for job_id in job_ids:
+        start_job(job_id)
+    return job_ids
+
+
+def shutdown() -> None:
+    """Stop running jobs without changing their status, so they resume on next start."""
+    for job_id in list(_tasks):
+        cancel_job(job_id)
+
+
+async def _process_item(item_id: int, job: ReplayJob) -> None:
+    db = SessionLocal()
+    try:
+        item = db.query(ReplayItem).filter(ReplayItem.id == item_id).first()
+        source = item.source_run
+        try:
+            run, _, _ = await execute_run(
+                db,
+                provider=job.provider,
+                model=job.model,
+                prompt=source.prompt,
+                schema=source.schema,
+                temperature=job.temperature,
+                template_id=source.template_id,
+                priority="batch",
+                replay_job_id=job.id
+            )
+            item.result_run_id = run.id
+            item.status = "done"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            db.rollback()
+            item.status = "failed"
+            item.error = str(e)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_job(job_id: int) -> None:
+    """Process a job's pending items with bounded concurrency, then write its report."""
+    db = SessionLocal()
+    try:
+        job = db.query(ReplayJob).filter(ReplayJob.id == job_id).first()
+        if job is None or job.status in ("completed", "cancelled"):
+            return
+        job.status = "running"
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+    finally:
+        db.close()
+
+    bucket = TokenBucket(job.requests_per_minute) if job.requests_per_minute else None
+    queue: asyncio.Queue = asyncio.Queue(maxsize=BATCH_SIZE)
+
+    async def worker():
+        while True:
+            item_id = await queue.get()
+            try:
+                if bucket is not None:
+                    while (wait := bucket.wait_time(1)) > 0:
+                        await asyncio.sleep(wait)
+                    bucket.take(1)
+                await _process_item(item_id, job)
+            except Exception:
+                # Keep the worker alive; the item stays pending and is retried on resume
+                logger.exception("Replay job %s: item %s failed", job_id, item_id)
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(job.concurrency or 1, 1))]
+    try:
+        last_id = 0
+        while True:
+            db = SessionLocal()
+            try:
+                batch = [
+                    item_id for (item_id,) in db.query(ReplayItem.id)
+                    .filter(ReplayItem.job_id == job_id, ReplayItem.status == "pending", ReplayItem.id > last_id)
+                    .order_by(ReplayItem.id)
+                    .limit(BATCH_SIZE)
+                ]
+            finally:
+                db.close()
+            if not batch:
+                break
+            for item_id in batch:
+                await queue.put(item_id)
+            last_id = batch[-1]
+        await queue.join()
+    except Exception:
+        logger.exception("Replay job %s failed", job_id)
+        _set_status(job_id, "failed")
+        raise
+    finally:
+        for task in workers:
+            task.cancel()
+        # After a quick cancel and resume, the entry may already belong to the new task
+        if _tasks.get(job_id) is asyncio.current_task():
+            del _tasks[job_id]
+
+    db = SessionLocal()
+    try:
+        job = db.query(ReplayJob).filter(ReplayJob.id == job_id).first()
+        job.report = build_report(db, job_id)
+        job.status = "completed"
+        db.commit()
+    finally:
+        db.close()
+
+
+def _set_status(job_id: int, status: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(ReplayJob).filter(ReplayJob.id == job_id).update({"status": status})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _summary(runs: List[Run]) -> dict:
+    latencies = [run.latency_ms for run in runs if run.latency_ms is not None]
+    tokens = [run.tokens_used for run in runs if run.tokens_used is not None]
+    return {
+        "runs": len(runs),
+        "success_rate": (sum(1 for run in runs if run.validation_status) / len(runs)) * 100 if runs else 0.0,
+        "avg_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_latency": percentile(latencies, 50) if latencies else 0.0,
+        "p95_latency": percentile(latencies, 95) if latencies else 0.0,
+        "p99_latency": percentile(latencies, 99) if latencies else 0.0,
+        "avg_tokens": sum(tokens) / len(tokens) if tokens else 0.0,
+        "avg_retries": sum(run.retry_count or 0 for run in runs) / len(runs) if runs else 0.0,
+    }
+
+
+def build_report(db, job_id: int) -> dict:
+    """Side-by-side comparison of source runs and their replays for finished items."""
+    items = (
+        db.query(ReplayItem)
+        .options(joinedload(ReplayItem.source_run), joinedload(ReplayItem.result_run))
+        .filter(ReplayItem.job_id == job_id, ReplayItem.status == "done")
+        .all()
+    )
+    sources = [item.source_run for item in items]
+    replays = [item.result_run for item in items]
+
+    token_deltas = [
+        replay.tokens_used - source.tokens_used
+        for source, replay in zip(sources, replays)
+        if replay.tokens_used is not None and source.tokens_used is not None
+    ]
+    return {
+        "compared": len(items),
+        "source": _summary(sources),
+        "replay": _summary(replays),
+        "avg_token_delta": sum(token_deltas) / len(token_deltas) if token_deltas else 0.0,
+        "newly_passing": sum(1 for s, r in zip(sources, replays) if r.validation_status and not s.validation_status),
+        "newly_failing": sum(1 for s, r in zip(sources, replays) if s.validation_status and not r.validation_status),
+    }
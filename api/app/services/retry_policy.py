@@ -0,0 +1,113 @@
+"""
+Adaptive retry budgets driven by run history.
+
+For each (template, model) pair the `runs` table tells us how often an
+output that failed validation was rescued by the 1st, 2nd, 3rd retry. Retries
+that rarely succeed only add latency, so the budget is cut to the last retry
+level whose conditional success rate is still worth paying for.
+"""
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from app.db.database import SessionLocal
+from app.db.models import Run
+
+MAX_RETRIES = 3
+# Retry levels seen fewer times than this are assumed to be worth keeping
+MIN_LEVEL_SAMPLES = 5
+MIN_RETRY_SUCCESS_RATE = float(os.getenv("RETRY_MIN_SUCCESS_RATE", "0.15"))
+# Share of requests that still get the full budget, so pruned levels keep being measured
+EXPLORATION_RATE = 0.05
+STATS_TTL_SECONDS = 300
+HISTORY_WINDOW = 1000
+MAX_ERRORS_IN_PROMPT = 10
+MAX_OUTPUT_IN_PROMPT = 4000
+
+
+@dataclass
+class RetryStats:
+    """Retry outcomes for one (template, model) pair.
+
+    `reached[k]` counts runs that got to retry k, `rescued[k]` counts runs
+    that first validated on retry k. Index 0 is the initial attempt.
+    """
+    reached: List[int] = field(default_factory=lambda: [0] * (MAX_RETRIES + 1))
+    rescued: List[int] = field(default_factory=lambda: [0] * (MAX_RETRIES + 1))
+
+    def add(self, retry_count: int, success: bool) -> None:
+        retry_count = min(retry_count or 0, MAX_RETRIES)
+        for level in range(retry_count + 1):
+            self.reached[level] += 1
+        if success:
+            self.rescued[retry_count] += 1
+
+    def success_rate(self, level: int) -> Optional[float]:
+        if self.reached[level] < MIN_LEVEL_SAMPLES:
+            return None
+        return self.rescued[level] / self.reached[level]
+
+    def budget(self) -> int:
+        """Highest retry level still worth attempting."""
+        for level in range(1, MAX_RETRIES + 1):
+            rate = self.success_rate(level)
+            if rate is not None and rate < MIN_RETRY_SUCCESS_RATE:
+                return level - 1
+        return MAX_RETRIES
+
+
+_cache: Dict[Tuple[Optional[int], str], Tuple[float, RetryStats]] = {}
+
+
+def get_retry_stats(template_id: Optional[int], model: str) -> RetryStats:
+    """Load (and cache) retry outcomes for recent runs of this template/model."""
+    key = (template_id, model)
+    cached = _cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    stats = RetryStats()
+    db = SessionLocal()
+    try:
+        query = db.query(Run.retry_count, Run.validation_status).filter(Run.model == model, Run.replay_job_id.is_(None))
+        if template_id is not None:
+            query = query.filter(Run.template_id == template_id)
+        for retry_count, validation_status in query.order_by(Run.id.desc()).limit(HISTORY_WINDOW):
+            stats.add(retry_count, bool(validation_status))
+    finally:
+        db.close()
+
+    _cache[key] = (time.monotonic() + STATS_TTL_SECONDS, stats)
+    return stats
+
+
+def retry_budget(template_id: Optional[int], model: str) -> int:
+    """Number of retries to allow for a request on this template/model."""
+    if random.random() < EXPLORATION_RATE:
+        return MAX_RETRIES
+    return get_retry_stats(template_id, model).budget()
+
+
+def build_repair_prompt(prompt: str, output: str, errors: list) -> str:
+    """Build an error-focused follow-up prompt from a failed attempt.
+
+    The model is asked to correct its previous answer rather than redo the
+    task. The original task is only repeated when the fix needs it: missing
+    required fields, or output that couldn't be parsed at all.
+    """
+    messages = [getattr(err, "message", str(err)) for err in errors]
+    needs_task = any("required property" in m or "Invalid JSON" in m for m in messages)
+
+    error_lines = "\n".join(
+        f"- {getattr(err, 'path', '') or '$'}: {getattr(err, 'message', str(err))}"
+        for err in errors[:MAX_ERRORS_IN_PROMPT]
+    )
+    parts = []
+    if needs_task:
+        parts.append(f"Original task:\n{prompt}")
+    parts.append(f"Your previous response:\n{output[:MAX_OUTPUT_IN_PROMPT]}")
+    parts.append(f"It failed schema validation with these errors:\n{error_lines}")
+    parts.append("Return only the corrected JSON, fixing these errors and keeping everything else unchanged.")
+    return "\n\n".join(parts)
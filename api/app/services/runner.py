@@ -0,0 +1,124 @@
+"""
+Admitted, persisted generation runs.
+
+Shared by every entry point that turns a prompt into a `Run`: the generate
+and compare endpoints and replay jobs.
+"""
+import os
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db.models import Run
+from app.services import metrics, timing
+from app.services.admission import DEFAULT_QUEUE_TIMEOUT, Ticket, admission_controller
+from app.services.hedging import HedgePolicy
+from app.services.llm import DEFAULT_DEADLINE_MS, GenerationResult, generate_with_enforcement
+from app.services.token_budget import estimate_max_tokens
+
+# Store each run's phase timings in `runs.timings`
+PERSIST_TIMINGS = os.getenv("PERSIST_RUN_TIMINGS", "true").lower() in ("1", "true", "yes")
+
+
+async def execute_run(
+    db: Session,
+    provider: str,
+    model: str,
+    prompt: str,
+    schema: dict,
+    temperature: float = 0.7,
+    max_tokens: Optional[int] = None,
+    api_key: Optional[str] = None,
+    template_id: Optional[int] = None,
+    priority: str = "interactive",
+    deadline_ms: Optional[float] = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    replay_job_id: Optional[int] = None
+) -> Tuple[Run, GenerationResult, Ticket]:
+    """Admit, generate and save a single run.
+
+    Args:
+        db: Session the new `Run` is committed to
+        provider: The LLM provider
+        model: The model name
+        prompt: The input prompt
+        schema: JSON schema for validation
+        temperature: Generation temperature
+        max_tokens: Output token limit, estimated when None
+        api_key: Optional user-provided API key
+        template_id: Template the prompt came from
+        priority: Admission priority ("interactive" or "batch")
+        deadline_ms: Overall time allowed, admission queueing included
+        hedge_policy: Optional hedging settings
+        replay_job_id: Replay job the run belongs to, if any
+
+    Raises:
+        AdmissionTimeout: If the request couldn't be admitted in time
+    """
+    start = time.perf_counter()
+    if deadline_ms is None:
+        deadline_ms = DEFAULT_DEADLINE_MS
+
+    with timing.trace() as trace:
+        max_tokens_auto = max_tokens is None
+        if max_tokens_auto:
+            with timing.span("token_budget"):
+                max_tokens = estimate_max_tokens(schema, template_id)
+
+        try:
+            async with admission_controller.admit(
+                provider=provider,
+                model=model,
+                priority=priority,
+                prompt=prompt,
+                max_tokens=max_tokens,
+                timeout=min(DEFAULT_QUEUE_TIMEOUT, deadline_ms / 1000)
+            ) as ticket:
+                trace.add("admission", ticket.queue_ms, priority)
+                result = await generate_with_enforcement(
+                    provider=provider,
+                    model=model,
+                    prompt=prompt,
+                    schema=schema,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    api_key=api_key,
+                    hedge_policy=hedge_policy,
+                    template_id=template_id,
+                    # Time spent queued comes out of the request's deadline
+                    deadline_ms=deadline_ms - (time.perf_counter() - start) * 1000
+                )
+                ticket.record_usage(result.tokens_used, result.retry_count + 1)
+        except Exception as e:
+            metrics.generation_failures.inc(provider=provider, model=model, error=type(e).__name__)
+            raise
+
+        run = Run(
+            template_id=template_id,
+            provider=provider,
+            model=model,
+            prompt=prompt,
+            schema=schema,
+            raw_output=result.raw_output,
+            parsed_output=result.parsed_output,
+            validation_status=result.validation_status,
+            validation_errors=result.validation_errors,
+            latency_ms=result.latency_ms,
+            total_latency_ms=result.total_latency_ms,
+            tokens_used=result.tokens_used,
+            retry_count=result.retry_count,
+            repair_count=result.repair_count,
+            max_tokens=result.max_tokens,
+            max_tokens_auto=max_tokens_auto,
+            truncation_retries=result.truncation_retries,
+            replay_job_id=replay_job_id,
+            # Stored with the run itself, so the commit span below only reaches the header
+            timings=list(trace.spans) if PERSIST_TIMINGS else None
+        )
+        db.add(run)
+        with timing.span("db_commit"):
+            db.commit()
+        db.refresh(run)
+
+    return run, result, ticket
@@ -0,0 +1,111 @@
+"""
+Full-text search over run prompts and outputs.
+
+Backed by `runs_fts`, an SQLite FTS5 index over `runs.prompt` and
+`runs.raw_output` that triggers keep in sync with the `runs` table (see
+`app.db.database`). Matches are ranked with bm25 and paged with a
+(rank, id) keyset cursor, so later pages cost the same as the first.
+
+To keep search fast on very large histories, ranking only considers the
+newest SEARCH_CANDIDATES matching runs. FTS5 walks its matches newest-first
+and stops there, so a very common term doesn't mean scoring every run that
+contains it. Searches with fewer matches are ranked in full; those that hit
+the cap are reported as truncated.
+"""
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, column, literal_column, or_, table
+
+from app.db.models import Run
+
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "1000"))
+# Matches the prefix index of runs_fts; shorter prefixes would expand to too many terms
+MIN_PREFIX_CHARS = 3
+
+runs_fts = table("runs_fts", column("rowid"), column("rank"))
+
+
+class InvalidCursor(ValueError):
+    """Raised when a search cursor can't be decoded."""
+
+
+def match_expression(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching runs that contain every term.
+
+    Terms are quoted so punctuation and FTS5 operators in user input are
+    matched literally. A trailing `*` makes a prefix search for terms of at
+    least MIN_PREFIX_CHARS characters; shorter terms are matched whole.
+    """
+    terms = []
+    for term in q.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        prefix = prefix and len(term) >= MIN_PREFIX_CHARS
+        if not re.search(r"\w", term):
+            continue
+        terms.append('"{}"'.format(term.replace('"', '""')) + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+def encode_cursor(rank: float, run_id: int) -> str:
+    return f"{rank!r}:{run_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, run_id = cursor.rsplit(":", 1)
+        return float(rank), int(run_id)
+    except ValueError:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+def search_runs(query, q: str, cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[Run], Optional[str], bool]:
+    """Rank the runs of `query` matching `q`, best first.
+
+    Args:
+        query: A `Run` query, typically with the history filters applied
+        q: Free-text search terms
+        cursor: `next_cursor` from the previous page
+        limit: Page size
+
+    Returns:
+        The page of runs, the cursor for the next page (None on the last page)
+        and whether matches beyond the newest SEARCH_CANDIDATES were left unranked
+
+    Raises:
+        InvalidCursor: If `cursor` is malformed
+    """
+    expression = match_expression(q)
+    if expression is None:
+        return [], None, False
+
+    matches = (
+        query.join(runs_fts, runs_fts.c.rowid == Run.id)
+        .filter(literal_column("runs_fts").op("MATCH")(expression))
+        .order_by(runs_fts.c.rowid.desc())
+    )
+    candidates = (
+        matches.with_entities(Run.id.label("id"), runs_fts.c.rank.label("rank"))
+        .limit(SEARCH_CANDIDATES)
+        .subquery()
+    )
+    # Walks the same newest-first matches as the candidates, without ranking them
+    truncated = matches.with_entities(Run.id).offset(SEARCH_CANDIDATES).limit(1).first() is not None
+
+    page = query.session.query(Run, candidates.c.rank).join(candidates, candidates.c.id == Run.id)
+    if cursor:
+        after_rank, after_id = decode_cursor(cursor)
+        page = page.filter(or_(
+            candidates.c.rank > after_rank,
+            and_(candidates.c.rank == after_rank, Run.id < after_id)
+        ))
+    rows = page.order_by(candidates.c.rank, Run.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_run, last_rank = rows[-1]
+        next_cursor = encode_cursor(last_rank, last_run.id)
+    return [run for run, _ in rows], next_cursor, truncated
@@ -0,0 +1,22 @@
+"""
+Small statistics helpers.
+
+Percentiles are computed in pure Python so workers don't load numpy just
+for this; sample sizes here are at most a few thousand values.
+"""
+from typing import Iterable
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Linearly interpolated percentile of `values` (numpy's default method).
+
+    Raises:
+        ValueError: If `values` is empty
+    """
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("percentile of an empty sequence")
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return float(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
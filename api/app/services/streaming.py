@@ -1,26 +1,38 @@
 """
 WebSocket streaming service using Parsec StreamingEngine
+
+Parsec and the provider SDKs are imported on first use to keep worker
+startup fast.
 """
 import os
+import time
 from fastapi import WebSocket
-from parsec.enforcement.streaming_engine import StreamingEngine
-from parsec.models.adapters import OpenAIAdapter, AnthropicAdapter
+
+from app.services import metrics
+from app.services.token_budget import CHARS_PER_TOKEN
 
 
 def create_adapter(provider: str, model: str):
     """Create LLM adapter based on provider"""
     if provider == "openai":
+        from parsec.models.adapters.openai_adapter import OpenAIAdapter
         api_key = os.getenv("OPENAI_API_KEY", "").strip()
         return OpenAIAdapter(
             model=model,
             api_key=api_key
         )
     elif provider == "anthropic":
+        from parsec.models.adapters.anthropic_adapter import AnthropicAdapter
         api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
         return AnthropicAdapter(
             model=model,
             api_key=api_key
         )
+    elif provider == "mock":
+        from app.services.mock_llm import MockAdapter, mock_enabled
+        if not mock_enabled():
+            raise ValueError(f"Unknown provider: {provider}")
+        return MockAdapter(model=model)
     # elif provider == "gemini":
     #     return GeminiAdapter(
     #         model=model,
@@ -43,6 +55,11 @@ async def stream_generate(
     Stream generation via WebSocket using Parsec StreamingEngine.
     Sends chunks to client as they arrive.
     """
+    from parsec.enforcement.streaming_engine import StreamingEngine
+
+    start = None
+    first_chunk = True
+    finished = False
     try:
         # Create adapter
         adapter = create_adapter(provider, model)
@@ -59,12 +76,21 @@ async def stream_generate(
         engine = StreamingEngine(adapter=adapter)
         
         # Stream with progressive parsing
+        start = time.perf_counter()
         async for chunk, parsed in engine.stream_with_parsing(
             prompt=prompt,
             schema=schema,
             temperature=temperature,
             max_tokens=max_tokens
         ):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if first_chunk and chunk.delta:
+                first_chunk = False
+                metrics.llm_time_to_first_token.observe(elapsed_ms, provider=provider, model=model)
+            if chunk.is_complete:
+                finished = True
+                metrics.observe_stream(provider, model, elapsed_ms, len(chunk.accumulated) // CHARS_PER_TOKEN)
+
             # Send chunk to frontend
             await websocket.send_json({
                 "type": "done" if chunk.is_complete else "chunk",
@@ -75,6 +101,10 @@ async def stream_generate(
             })
             
     except Exception as e:
+        if start is not None and not finished:
+            metrics.llm_request_duration.observe(
+                (time.perf_counter() - start) * 1000, provider=provider, model=model, outcome="error"
+            )
         await websocket.send_json({
             "type": "error",
             "message": str(e)
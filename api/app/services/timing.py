@@ -0,0 +1,78 @@
+"""
+Per-request phase timing.
+
+A `Trace` collects timed spans for one run (admission, adapter construction,
+each LLM attempt, validation, backoff, DB commit). The active trace lives in
+a context variable so deeply nested code can add spans without threading it
+through every call; `span()` is a no-op when no trace is active. Tasks
+spawned inside a trace (e.g. hedged attempts) add to the same trace.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    """Spans recorded for a single request, in milliseconds from its start."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[dict] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def add(self, name: str, duration_ms: float, description: Optional[str] = None) -> None:
+        """Record a span that just ended and lasted `duration_ms`."""
+        self.spans.append({
+            "name": name,
+            "start_ms": round(max(self.elapsed_ms() - duration_ms, 0.0), 3),
+            "duration_ms": round(duration_ms, 3),
+            "description": description,
+        })
+
+    def server_timing(self) -> str:
+        """Format the spans (plus the total so far) as a Server-Timing header value."""
+        entries = []
+        for span in self.spans + [{"name": "total", "duration_ms": round(self.elapsed_ms(), 3), "description": None}]:
+            entry = f"{span['name']};dur={span['duration_ms']}"
+            if span["description"]:
+                entry += ';desc="{}"'.format(span["description"].replace("\\", "\\\\").replace('"', '\\"'))
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """Activate a trace for the enclosed code, reusing one that is already active."""
+    existing = _current.get()
+    if existing is not None:
+        yield existing
+        return
+    new_trace = Trace()
+    token = _current.set(new_trace)
+    try:
+        yield new_trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, description: Optional[str] = None) -> Iterator[None]:
+    """Time the enclosed block as a span of the active trace, if any."""
+    active = _current.get()
+    if active is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.add(name, (time.perf_counter() - start) * 1000, description)
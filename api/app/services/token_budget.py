@@ -0,0 +1,125 @@
+"""
+Schema-aware output token budgets.
+
+When a client doesn't set max_tokens, the budget is predicted from the
+structure of the JSON schema and from completion sizes of past successful
+runs of the same template, so small schemas don't get a blanket allowance
+and large ones aren't truncated into failed validations.
+"""
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.db.database import SessionLocal
+from app.db.models import Run
+from app.services.stats import percentile
+
+MIN_MAX_TOKENS = 128
+MAX_MAX_TOKENS = 4096
+SCHEMA_HEADROOM = 1.5
+HISTORY_HEADROOM = 1.2
+HISTORY_PERCENTILE = 95
+MIN_HISTORY_SAMPLES = 10
+HISTORY_WINDOW = 500
+STATS_TTL_SECONDS = 300
+CHARS_PER_TOKEN = 4
+DEFAULT_ARRAY_ITEMS = 5
+MAX_SCHEMA_DEPTH = 8
+
+# Rough JSON token cost of scalar values when the schema gives no size hints
+SCALAR_TOKENS = {
+    "string": 24,
+    "number": 3,
+    "integer": 3,
+    "boolean": 1,
+    "null": 1,
+}
+
+_history_cache: Dict[int, Tuple[float, Optional[float]]] = {}
+
+
+def estimate_schema_tokens(schema: Any, depth: int = 0) -> float:
+    """Estimate the tokens needed to emit a value matching `schema`."""
+    if not isinstance(schema, dict) or depth > MAX_SCHEMA_DEPTH:
+        return SCALAR_TOKENS["string"]
+
+    if "enum" in schema:
+        return max((len(json.dumps(v)) / CHARS_PER_TOKEN for v in schema["enum"]), default=1) + 1
+    if "const" in schema:
+        return len(json.dumps(schema["const"])) / CHARS_PER_TOKEN + 1
+    for combinator in ("anyOf", "oneOf"):
+        if combinator in schema:
+            return max((estimate_schema_tokens(s, depth + 1) for s in schema[combinator]), default=1)
+    if "allOf" in schema:
+        return sum(estimate_schema_tokens(s, depth + 1) for s in schema["allOf"])
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        return max(estimate_schema_tokens({**schema, "type": t}, depth) for t in schema_type)
+
+    if schema_type == "object" or "properties" in schema:
+        total = 2.0  # braces
+        for key, subschema in schema.get("properties", {}).items():
+            # Quoted key, colon, comma and indentation
+            total += len(key) / CHARS_PER_TOKEN + 3
+            total += estimate_schema_tokens(subschema, depth + 1)
+        return total
+
+    if schema_type == "array":
+        items = schema.get("maxItems") or max(schema.get("minItems", 0), DEFAULT_ARRAY_ITEMS)
+        return 2.0 + items * (estimate_schema_tokens(schema.get("items"), depth + 1) + 1)
+
+    if schema_type == "string" and "maxLength" in schema:
+        return schema["maxLength"] / CHARS_PER_TOKEN + 2
+
+    return SCALAR_TOKENS.get(schema_type, SCALAR_TOKENS["string"])
+
+
+def _completion_tokens(run: Run) -> float:
+    """Approximate the completion part of a run's total `tokens_used`."""
+    prompt_chars = len(run.prompt or "") + len(json.dumps(run.schema or {}))
+    return max(run.tokens_used - prompt_chars / CHARS_PER_TOKEN, 0.0)
+
+
+def history_tokens(template_id: int) -> Optional[float]:
+    """High-percentile completion size of recent successful runs of a template."""
+    cached = _history_cache.get(template_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    db = SessionLocal()
+    try:
+        runs = (
+            db.query(Run)
+            .filter(
+                Run.template_id == template_id,
+                Run.replay_job_id.is_(None),
+                Run.validation_status == True,
+                Run.tokens_used.isnot(None)
+            )
+            .order_by(Run.id.desc())
+            .limit(HISTORY_WINDOW)
+            .all()
+        )
+        samples = [_completion_tokens(run) for run in runs]
+    finally:
+        db.close()
+
+    value = percentile(samples, HISTORY_PERCENTILE) if len(samples) >= MIN_HISTORY_SAMPLES else None
+    _history_cache[template_id] = (time.monotonic() + STATS_TTL_SECONDS, value)
+    return value
+
+
+def estimate_max_tokens(schema: dict, template_id: Optional[int] = None) -> int:
+    """Predict an output token budget for a schema (and template, if known).
+
+    Args:
+        schema: JSON schema the output must match
+        template_id: Template whose past runs inform the estimate
+    """
+    budget = estimate_schema_tokens(schema) * SCHEMA_HEADROOM
+    if template_id is not None:
+        observed = history_tokens(template_id)
+        if observed is not None:
+            budget = max(budget, observed * HISTORY_HEADROOM)
+    return int(min(max(budget, MIN_MAX_TOKENS), MAX_MAX_TOKENS))
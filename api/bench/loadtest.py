@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the API using the mock LLM provider.
+
+Starts the API (unless --url is given) with ENABLE_MOCK_PROVIDER set and a
+fresh database, drives the generate, stream, history and analytics endpoints
+at a fixed concurrency, and reports throughput, latency percentiles and the
+server's event-loop lag (scraped from /metrics).
+
+Run from the api directory:
+
+    python -m bench.loadtest --requests 500 --concurrency 32 --output bench/baseline.json
+    python -m bench.loadtest --requests 500 --concurrency 32 --compare bench/baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+from app.services.mock_llm import MockConfig
+from app.services.stats import percentile
+
+API_DIR = Path(__file__).resolve().parent.parent
+SCENARIOS = ("generate", "stream", "history", "analytics")
+STARTUP_TIMEOUT_S = 30
+MODEL = "bench-model"
+# Latency percentile gated by --compare, by key
+GATED_PERCENTILES = {"p50_ms": 50, "p95_ms": 95, "p99_ms": 99}
+# A percentile with fewer samples above it than this is just the slowest request or two
+MIN_TAIL_SAMPLES = 5
+# The server samples loop lag every 0.5s, so short scenarios only see a handful
+MIN_LAG_SAMPLES = 20
+# Shorter scenarios measure the host's scheduling noise more than the server
+MIN_COMPARE_S = 1.0
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "age": {"type": "integer", "minimum": 18, "maximum": 90},
+        "email": {"type": "string", "format": "email"},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 3},
+        "address": {
+            "type": "object",
+            "properties": {"city": {"type": "string"}, "zip": {"type": "string", "maxLength": 5}},
+        },
+    },
+    "required": ["name", "age", "email"],
+}
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    return percentile(values, pct) if values else None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(mock: MockConfig):
+    """Run the API in a subprocess against a throwaway database."""
+    workdir = tempfile.mkdtemp(prefix="parsec-bench-")
+    port = free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(API_DIR), os.getenv("PYTHONPATH")])),
+        "ENABLE_MOCK_PROVIDER": "1",
+        "MOCK_LATENCY_MS": str(mock.latency_ms),
+        "MOCK_LATENCY_DISTRIBUTION": mock.latency_distribution,
+        "MOCK_LATENCY_SPREAD": str(mock.latency_spread),
+        "MOCK_TOKENS_PER_SECOND": str(mock.tokens_per_second),
+        "MOCK_INVALID_RATE": str(mock.invalid_rate),
+        "MOCK_SEED": str(mock.seed),
+        # Measure the API, not the admission limits
+        "MOCK_MAX_CONCURRENCY": "100000",
+        "MOCK_MAX_CONCURRENCY_PER_MODEL": "100000",
+        "MOCK_REQUESTS_PER_MINUTE": "1e9",
+        "MOCK_TOKENS_PER_MINUTE": "1e12",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT_S
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"API server exited with code {process.returncode}")
+            try:
+                if httpx.get(url + "/").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("API server did not start in time")
+            time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class Context:
+    """State shared between scenarios."""
+
+    def __init__(self, base_url: str, seed: int):
+        self.ws_url = base_url.replace("http", "ws", 1) + "/api/ws/stream"
+        self.seed = seed
+        self.template_id: Optional[int] = None
+        self.run_ids: List[int] = []
+        self.first_chunk_ms: List[float] = []
+
+    def request_body(self, i: int) -> dict:
+        return {
+            "provider": "mock",
+            "model": MODEL,
+            "prompt": f"Bench request {self.seed}-{i}: extract the person described below.",
+            "json_schema": SCHEMA,
+            "temperature": 0.0,
+            "template_id": self.template_id,
+        }
+
+
+async def ensure_template(client: httpx.AsyncClient, ctx: Context) -> None:
+    name = f"bench-{ctx.seed}"
+    response = await client.post("/api/templates/", json={"name": name, "content": "{text}", "json_schema": SCHEMA})
+    if response.status_code == 201:
+        ctx.template_id = response.json()["id"]
+        return
+    templates = (await client.get("/api/templates/")).json()
+    ctx.template_id = next(t["id"] for t in templates if t["name"] == name)
+
+
+async def call_generate(client: httpx.AsyncClient, i: int, ctx: Context) -> None:
+    response = await client.post("/api/generate", json=ctx.request_body(i))
+    response.raise_for_status()
+    ctx.run_ids.append(response.json()["run_id"])
+
+
+async def call_stream(client: httpx.AsyncClient, i: int, ctx: Context) -> None:
+    start = time.perf_counter()
+    body = ctx.request_body(i)
+    body["schema"] = body.pop("json_schema")
+    async with websockets.connect(ctx.ws_url) as ws:
+        await ws.send(json.dumps(body))
+        first = True
+        while True:
+            message = json.loads(await ws.recv())
+            if message["type"] == "error":
+                raise RuntimeError(message["message"])
+            if first:
+                ctx.first_chunk_ms.append((time.perf_counter() - start) * 1000)
+                first = False
+            if message["type"] == "done":
+                return
+
+
+async def call_history(client: httpx.AsyncClient, i: int, ctx: Context) -> None:
+    if i % 2 and ctx.run_ids:
+        response = await client.get(f"/api/history/{ctx.run_ids[i % len(ctx.run_ids)]}")
+    elif i % 4 == 2:
+        response = await client.get("/api/history/", params={"q": "extract person", "page_size": 20})
+    else:
+        response = await client.get("/api/history/", params={"page": (i // 2) % 10 + 1, "page_size": 20})
+    response.raise_for_status()
+
+
+async def call_analytics(client: httpx.AsyncClient, i: int, ctx: Context) -> None:
+    if i % 2 and ctx.template_id is not None:
+        response = await client.get(f"/api/analytics/{ctx.template_id}")
+    else:
+        response = await client.get("/api/analytics/")
+    response.raise_for_status()
+
+
+CALLS = {
+    "generate": call_generate,
+    "stream": call_stream,
+    "history": call_history,
+    "analytics": call_analytics,
+}
+
+
+async def scrape_loop_lag(client: httpx.AsyncClient) -> Optional[Dict[str, float]]:
+    """Cumulative event_loop_lag_ms histogram from /metrics, keyed by bucket bound."""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    buckets = {}
+    for line in response.text.splitlines():
+        if line.startswith("event_loop_lag_ms_bucket"):
+            bound = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets[bound] = float(line.rsplit(" ", 1)[1])
+        elif line.startswith("event_loop_lag_ms_sum"):
+            buckets["sum"] = float(line.rsplit(" ", 1)[1])
+    return buckets
+
+
+def loop_lag_summary(before: Optional[dict], after: Optional[dict]) -> dict:
+    """Mean and bucketed p99/max event-loop lag between two scrapes."""
+    if not before or not after or "+Inf" not in after:
+        return {"loop_lag_samples": 0, "loop_lag_mean_ms": None, "loop_lag_p99_ms": None, "loop_lag_max_ms": None}
+    count = after["+Inf"] - before.get("+Inf", 0)
+    bounds = [b for b in after if b not in ("sum", "+Inf")]
+    deltas = [(float(b), after[b] - before.get(b, 0)) for b in bounds]
+
+    def upper_bound(share: float) -> Optional[float]:
+        for bound, cumulative in deltas:
+            if cumulative >= share * count:
+                return bound
+        return None  # Beyond the largest bucket
+
+    return {
+        "loop_lag_samples": int(count),
+        "loop_lag_mean_ms": (after["sum"] - before.get("sum", 0)) / count if count else None,
+        "loop_lag_p99_ms": upper_bound(0.99) if count else None,
+        "loop_lag_max_ms": upper_bound(1.0) if count else None,
+    }
+
+
+async def run_scenario(name: str, client: httpx.AsyncClient, ctx: Context, requests: int, concurrency: int) -> dict:
+    call = CALLS[name]
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    ctx.first_chunk_ms = []
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            try:
+                await call(client, i, ctx)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    lag_before = await scrape_loop_lag(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+    lag_after = await scrape_loop_lag(client)
+
+    result = {
+        "requests": requests,
+        "errors": sum(errors.values()),
+        "error_types": errors,
+        "error_rate": sum(errors.values()) / requests if requests else 0.0,
+        "duration_s": duration,
+        "throughput_rps": len(latencies) / duration if duration else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+        **loop_lag_summary(lag_before, lag_after),
+    }
+    if ctx.first_chunk_ms:
+        result["first_chunk_p50_ms"] = _percentile(ctx.first_chunk_ms, 50)
+        result["first_chunk_p95_ms"] = _percentile(ctx.first_chunk_ms, 95)
+    return result
+
+
+async def run_benchmark(base_url: str, args) -> dict:
+    ctx = Context(base_url, args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await ensure_template(client, ctx)
+        # Warm caches and connection pools; also seeds runs for the history scenario
+        for i in range(args.warmup):
+            await call_generate(client, -1 - i, ctx)
+
+        results = {}
+        for name in args.scenarios:
+            print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}...", file=sys.stderr)
+            results[name] = await run_scenario(name, client, ctx, args.requests, args.concurrency)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(results: dict) -> None:
+    columns = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "loop_lag_mean_ms", "loop_lag_p99_ms")
+    print(f"{'scenario':<10} {'errors':>7} " + " ".join(f"{c:>16}" for c in columns))
+    for name, result in results.items():
+        print(f"{name:<10} {result['errors']:>7} " + " ".join(f"{_fmt(result[c]):>16}" for c in columns))
+
+
+def compare(baseline: dict, current: dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Regressions of `current` against `baseline`.
+
+    Throughput may drop, and latencies may rise, by at most `tolerance`
+    (a fraction). Latency increases below `min_delta_ms` are treated as noise,
+    as are percentiles with fewer than MIN_TAIL_SAMPLES requests above them
+    in either run. Event-loop lag is compared by its mean, once both runs
+    have MIN_LAG_SAMPLES lag samples; the p99 is only a histogram bucket
+    bound, and moving one bucket already looks like a regression. Only error
+    rates are compared for scenarios that ran for less than MIN_COMPARE_S.
+    """
+    regressions = []
+    for name, base in baseline["scenarios"].items():
+        result = current["scenarios"].get(name)
+        if result is None:
+            continue
+        if result["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {base['error_rate']:.1%} -> {result['error_rate']:.1%}")
+        if min(base["duration_s"], result["duration_s"]) < MIN_COMPARE_S:
+            continue
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {base['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s"
+            )
+        samples = min(
+            base["requests"] - base.get("errors", 0),
+            result["requests"] - result.get("errors", 0)
+        )
+        keys = [
+            key for key, pct in GATED_PERCENTILES.items()
+            if samples * (100 - pct) / 100 >= MIN_TAIL_SAMPLES
+        ]
+        if min(base.get("loop_lag_samples", 0), result.get("loop_lag_samples", 0)) >= MIN_LAG_SAMPLES:
+            keys.append("loop_lag_mean_ms")
+        for key in keys:
+            before, after = base.get(key), result.get(key)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{name}: {key} {before:.1f} -> {after:.1f}")
+    return regressions
+
+
+def parse_args(argv=None):
+    defaults = MockConfig()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="Benchmark a running server (started with ENABLE_MOCK_PROVIDER=1) instead of starting one")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured generate requests before the scenarios")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="Mock time to first token")
+    parser.add_argument("--latency-distribution", choices=("fixed", "uniform", "lognormal"), default=defaults.latency_distribution)
+    parser.add_argument("--latency-spread", type=float, default=defaults.latency_spread)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--invalid-rate", type=float, default=defaults.invalid_rate, help="Share of mock outputs that are truncated JSON")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", help="Write results to this JSON file (e.g. a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions; exits 1 if any are found")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative change before flagging a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore latency increases smaller than this")
+    args = parser.parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    mock = MockConfig(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second,
+        invalid_rate=args.invalid_rate,
+        seed=args.seed,
+    )
+    config = {
+        "scenarios": args.scenarios,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "warmup": args.warmup,
+        "mock": vars(mock),
+    }
+
+    if args.url:
+        results = asyncio.run(run_benchmark(args.url.rstrip("/"), args))
+    else:
+        with serve(mock) as url:
+            results = asyncio.run(run_benchmark(url, args))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": config,
+        "scenarios": results,
+    }
+    print_report(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get("config") != config:
+            print("Warning: baseline was recorded with a different configuration", file=sys.stderr)
+        short = [
+            name for name, result in results.items()
+            if name in baseline["scenarios"]
+            and min(result["duration_s"], baseline["scenarios"][name]["duration_s"]) < MIN_COMPARE_S
+        ]
+        if short:
+            print(f"Latency not compared (ran under {MIN_COMPARE_S:g}s, raise --requests): {', '.join(short)}", file=sys.stderr)
+        regressions = compare(baseline, report, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
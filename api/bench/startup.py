@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for API workers.
+
+Measures, in fresh processes, how long `import app.main` takes, how long a
+new uvicorn worker takes from spawn to its first 200 response, and how long
+from spawn to its first successful `/api/generate` (against the mock
+provider, sent as soon as the worker answers), and checks the medians
+against the budget in bench/startup_budget.json. The committed budget is
+the target (new workers serving within a second); on slower hosts pass a
+local file with --budget instead of loosening it.
+
+Run from the api directory:
+
+    python -m bench.startup
+    python -m bench.startup --runs 10 --output startup.json
+    python -m bench.startup --budget startup_budget.local.json
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.services.stats import percentile
+from bench.loadtest import API_DIR, free_port
+
+DEFAULT_BUDGET = Path(__file__).resolve().parent / "startup_budget.json"
+POLL_INTERVAL_S = 0.005
+STARTUP_TIMEOUT_S = 30
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+GENERATE_BODY = json.dumps({
+    "provider": "mock",
+    "model": "startup",
+    "prompt": "Startup check",
+    "json_schema": {"type": "object", "properties": {"ok": {"type": "boolean"}}},
+})
+
+
+def _env() -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(API_DIR), os.getenv("PYTHONPATH")])),
+        "ENABLE_MOCK_PROVIDER": "1",
+        "MOCK_LATENCY_MS": "0",
+        "MOCK_TOKENS_PER_SECOND": "0",
+    }
+
+
+def _request(port: int, method: str, path: str, body: Optional[str] = None) -> Optional[int]:
+    """Status of a single request, or None if the worker isn't accepting connections yet."""
+    # A bare connection per request; building an HTTP client each time would skew the timing
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=STARTUP_TIMEOUT_S)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        return connection.getresponse().status
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def measure_import(workdir: str) -> float:
+    """Seconds to import the application in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=workdir, env=_env(), capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+@contextmanager
+def _worker(workdir: str):
+    """Spawn a uvicorn worker and yield (port, spawn time) once it answers `GET /`."""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=_env(),
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        while _request(port, "GET", "/") != 200:
+            if process.poll() is not None:
+                raise RuntimeError(f"API server exited with code {process.returncode}")
+            if time.perf_counter() - start > STARTUP_TIMEOUT_S:
+                raise RuntimeError("API server did not start in time")
+            time.sleep(POLL_INTERVAL_S)
+        yield port, start
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def measure_first_response(workdir: str) -> float:
+    """Seconds from spawning a uvicorn worker to its first 200 response."""
+    with _worker(workdir) as (_, start):
+        return time.perf_counter() - start
+
+
+def measure_first_generate(workdir: str) -> Tuple[float, float]:
+    """Seconds from spawn to the first successful `/api/generate`, and for that request alone.
+
+    The request is sent as soon as the worker answers, while provider
+    modules may still be loading in the background.
+    """
+    with _worker(workdir) as (port, start):
+        sent = time.perf_counter()
+        status = _request(port, "POST", "/api/generate", GENERATE_BODY)
+        if status != 200:
+            raise RuntimeError(f"First /api/generate returned {status}")
+        done = time.perf_counter()
+        return done - start, done - sent
+
+
+def _summary(samples: List[float]) -> dict:
+    return {"median_s": percentile(samples, 50), "max_s": max(samples), "samples": samples}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="Processes started per measurement")
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET), help="JSON file with import_s, first_response_s and first_generate_s limits")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="parsec-startup-")
+    try:
+        # The first worker creates the schema; later ones start against an existing database
+        fresh_db = measure_first_response(workdir)
+        imports = [measure_import(workdir) for _ in range(args.runs)]
+        responses = [measure_first_response(workdir) for _ in range(args.runs)]
+        generates = [measure_first_generate(workdir) for _ in range(args.runs)]
+        results = {
+            "import": _summary(imports),
+            "first_response": _summary(responses),
+            "first_generate": _summary([total for total, _ in generates]),
+            "first_generate_request": _summary([request for _, request in generates]),
+            "first_response_fresh_db_s": fresh_db,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    budget = json.loads(Path(args.budget).read_text())
+    checks = [
+        ("import", results["import"]["median_s"], budget["import_s"]),
+        ("first_response", results["first_response"]["median_s"], budget["first_response_s"]),
+        ("first_generate", results["first_generate"]["median_s"], budget["first_generate_s"]),
+    ]
+    print(f"{'measurement':<16} {'median_s':>9} {'max_s':>9} {'budget_s':>9}")
+    for name, median, limit in checks:
+        print(f"{name:<16} {median:>9.3f} {results[name]['max_s']:>9.3f} {limit:>9.3f}")
+    request = results["first_generate_request"]
+    print(f"{'generate request':<16} {request['median_s']:>9.3f} {request['max_s']:>9.3f}")
+    print(f"{'first (new db)':<16} {fresh_db:>9.3f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"budget": budget, "results": results}, indent=2) + "\n")
+
+    over = [name for name, median, limit in checks if median > limit]
+    if over:
+        print(f"\nOver budget: {', '.join(over)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
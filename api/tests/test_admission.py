@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionTimeout, ProviderLimits
+
+
+def test_admission_granted_as_timeout_fires_releases_the_slot(monkeypatch):
+    controller = AdmissionController({"openai": ProviderLimits(max_concurrency=1)})
+
+    async def scenario():
+        held = await controller.acquire("openai", "m", estimated_tokens=1)
+
+        async def admitted_then_timed_out(future, timeout):
+            # The held slot is handed to the waiter in the same tick its timeout fires
+            controller.release(held)
+            assert future.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, "wait_for", admitted_then_timed_out)
+        with pytest.raises(AdmissionTimeout):
+            await controller.acquire("openai", "m", estimated_tokens=1, timeout=0.01)
+        monkeypatch.undo()
+
+        state = controller._state("openai")
+        assert state.active == 0
+        assert state.active_by_model["m"] == 0
+        # The slot is usable again
+        assert controller.try_acquire("openai", "m", estimated_tokens=1) is not None
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_times_out_without_holding_a_slot():
+    controller = AdmissionController({"openai": ProviderLimits(max_concurrency=1)})
+
+    async def scenario():
+        held = await controller.acquire("openai", "m", estimated_tokens=1)
+        with pytest.raises(AdmissionTimeout):
+            await controller.acquire("openai", "m", estimated_tokens=1, timeout=0.01)
+        controller.release(held)
+
+        state = controller._state("openai")
+        assert state.active == 0 and not state.queue
+
+    asyncio.run(scenario())
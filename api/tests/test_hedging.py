@@ -0,0 +1,65 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import hedging
+from app.services.hedging import HedgePolicy, HedgeStats, LatencyTracker, run_hedged
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    tracker = LatencyTracker()
+    tracker._samples[("openai", "m")] = deque([10.0] * 20)
+    monkeypatch.setattr(hedging, "latency_tracker", tracker)
+    stats = HedgeStats(primary_tokens=1000)
+    monkeypatch.setattr(hedging, "hedge_stats", stats)
+    return stats
+
+
+def _result(valid: bool):
+    return SimpleNamespace(validation_status=valid, tokens_used=10, retry_count=0)
+
+
+def _hedge(primary, backup):
+    return asyncio.run(run_hedged(
+        primary=primary,
+        backup=backup,
+        provider="openai",
+        model="m",
+        backup_provider="openai",
+        backup_model="m",
+        policy=HedgePolicy(percentile=50, min_samples=1),
+        cancelled_cost=10
+    ))
+
+
+async def _failing_primary():
+    await asyncio.sleep(0.05)
+    raise ConnectionError("provider unreachable")
+
+
+def test_invalid_backup_is_not_a_hedge_win(stats):
+    async def backup():
+        return _result(valid=False)
+
+    result = _hedge(_failing_primary, backup)
+
+    assert not result.validation_status
+    assert stats.hedges == 1
+    assert stats.hedge_wins == 0
+    assert stats.latency_saved_ms == 0.0
+
+
+def test_valid_backup_is_a_hedge_win(stats):
+    async def slow_primary():
+        await asyncio.sleep(0.2)
+        return _result(valid=True)
+
+    async def backup():
+        return _result(valid=True)
+
+    _hedge(slow_primary, backup)
+
+    assert stats.hedge_wins == 1
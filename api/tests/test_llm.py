@@ -0,0 +1,23 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import llm
+
+
+class FailingAdapter:
+    async def generate(self, *args, **kwargs):
+        raise ConnectionError("provider unreachable")
+
+
+def test_backoff_stops_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(llm, "create_adapter", lambda *args, **kwargs: FailingAdapter())
+    monkeypatch.setattr(llm, "retry_budget", lambda *args: 3)
+
+    start = time.perf_counter()
+    with pytest.raises(ConnectionError):
+        asyncio.run(llm.generate_with_enforcement(
+            "openai", "m", "prompt", {"type": "object"}, max_tokens=100, deadline_ms=300
+        ))
+    assert time.perf_counter() - start < 0.35
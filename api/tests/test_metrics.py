@@ -0,0 +1,9 @@
+from app.services.metrics import Histogram
+
+
+def test_histogram_renders_each_bucket_once():
+    histogram = Histogram("example_ms", "Example", ["route"], buckets=(1, 10, 10, 5))
+    histogram.observe(7, route="/")
+
+    lines = [line for line in histogram.render().splitlines() if line.startswith("example_ms_bucket")]
+    assert [line.split("le=")[1] for line in lines] == ['"1"} 0', '"5"} 0', '"10"} 1', '"+Inf"} 1']
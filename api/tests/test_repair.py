@@ -0,0 +1,111 @@
+import pytest
+
+from app.services.repair import RepairingValidator, _normalize_number, _parse, is_truncated, repair_json
+
+
+@pytest.mark.parametrize("token, expected", [
+    ("1", "1"),
+    ("-2.5e10", "-2.5e10"),
+    (".5", "0.5"),
+    ("-.25", "-0.25"),
+    ("+1", "1"),
+    ("1.", "1"),
+    ("1.e5", "1e5"),
+    ("007", "7"),
+    ("-", "-"),
+    ("1e", "1e"),
+    ("1-2", "1-2"),
+])
+def test_normalize_number(token, expected):
+    assert _normalize_number(token) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1e5, "b": .5}', {"a": 100000.0, "b": 0.5}),
+    ('{"a": +1, "b": 1., "c": 007}', {"a": 1, "b": 1, "c": 7}),
+    ("{'a': 'it\\'s', 'b': True, 'c': None}", {"a": "it's", "b": True, "c": None}),
+    ('{a: 1, b: [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('```json\n{"a": 1} // done\n```', {"a": 1}),
+    ('Here you go: {"a": {"b": [1]}} Hope that helps!', {"a": {"b": [1]}}),
+])
+def test_parse_fixes_syntax(text, expected):
+    assert _parse(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1, "b": "hal', {"a": 1, "b": "hal"}),
+    ('{"a": 1, "b": 1e', {"a": 1}),
+    ('{"a": 1, "b":', {"a": 1}),
+])
+def test_parse_trims_truncated_output(text, expected):
+    assert _parse(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": -}',
+    '{"a": 1, "b": 1-2}',
+    '{"a": 1 "b": 2}',
+])
+def test_parse_rejects_complete_output_instead_of_dropping_fields(text):
+    with pytest.raises(ValueError):
+        _parse(text)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', False),
+    ('{"a": "}"}', False),
+    ('{"a": "x\\"}', True),
+    ('{"a": [1, 2', True),
+    ('{"a": "hel', True),
+    ("", False),
+])
+def test_is_truncated(text, expected):
+    assert is_truncated(text) is expected
+
+
+def test_repair_json_coerces_to_schema():
+    schema = {
+        "type": "object",
+        "properties": {
+            "age": {"type": "integer"},
+            "score": {"type": "number"},
+            "active": {"type": "boolean"},
+            "tags": {"type": "array", "items": {"type": "string"}},
+            "zip": {"type": "string"},
+        },
+    }
+    output = "{'age': '42', 'score': '.5', 'active': 'yes', 'tags': 'x', 'zip': 12345}"
+    assert repair_json(output, schema) == {"age": 42, "score": 0.5, "active": True, "tags": ["x"], "zip": "12345"}
+
+
+def test_repair_json_returns_none_when_unparseable():
+    assert repair_json("no json here", {"type": "object"}) is None
+
+
+def test_repairing_validator_counts_hits():
+    schema = {"type": "object", "properties": {"a": {"type": "integer"}}, "required": ["a"]}
+    validator = RepairingValidator()
+
+    assert validator.validate_and_repair('{"a": 1}', schema).status.value == "valid"
+    assert validator.repair_hits == 0
+
+    result = validator.validate_and_repair("{'a': 1,}", schema)
+    assert result.status.value == "valid"
+    assert result.parsed_output == {"a": 1}
+    assert validator.repair_hits == 1
+
+    assert validator.validate_and_repair('{"a": -}', schema).status.value != "valid"
+    assert validator.repair_hits == 1
+
+
+def test_repairing_validator_leaves_truncated_output_when_asked():
+    schema = {"type": "object", "properties": {"a": {"type": "string"}}}
+    validator = RepairingValidator()
+
+    assert validator.validate_and_repair('{"a": "hel', schema, repair_truncated=False).status.value != "valid"
+    assert validator.repair_hits == 0
+    # Syntax slips in complete output are still repaired
+    assert validator.validate_and_repair("{'a': 'hello'}", schema, repair_truncated=False).status.value == "valid"
+    assert validator.validate_and_repair('{"a": "hel', schema).parsed_output == {"a": "hel"}
+    assert validator.repair_hits == 2
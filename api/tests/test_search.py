@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import database
+from app.db.models import Run
+from app.services import search
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    database.init_db()
+    session = sessionmaker(bind=engine)()
+    for index in range(5):
+        session.add(Run(provider="mock", model="m", prompt=f"invoice {index}", raw_output="{}"))
+    session.add(Run(provider="mock", model="m", prompt="receipt", raw_output="{}"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_search_reports_when_candidates_are_capped(db, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_CANDIDATES", 3)
+
+    runs, next_cursor, truncated = search.search_runs(db.query(Run), "invoice")
+
+    assert truncated
+    # Only the newest candidates are ranked
+    assert sorted(run.prompt for run in runs) == ["invoice 2", "invoice 3", "invoice 4"]
+
+
+def test_search_within_cap_is_not_truncated(db, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_CANDIDATES", 5)
+
+    runs, next_cursor, truncated = search.search_runs(db.query(Run), "invoice", limit=2)
+
+    assert not truncated
+    assert len(runs) == 2 and next_cursor is not None